@@ -8,9 +8,6 @@ from controllers.console import api
 from controllers.console.app.wraps import get_app_model
 from controllers.console.setup import setup_required
 from controllers.console.wraps import account_initialization_required
-from core.agent.entities import AgentToolEntity
-from core.tools.tool_manager import ToolManager
-from core.tools.utils.configuration import ToolParameterConfigurationManager
 from events.app_event import app_model_config_was_updated
 from extensions.ext_database import db
 from libs.login import login_required
@@ -39,10 +36,13 @@ class ModelConfigResource(Resource):
         new_app_model_config = new_app_model_config.from_model_config_dict(model_configuration)
 
         if app_model.mode == AppMode.AGENT_CHAT.value or app_model.is_agent:
+            # local import: rare path, only agent apps need the agent tool modules
+            from core.agent.entities import AgentToolEntity
+            from core.tools.tool_manager import ToolManager
+            from core.tools.utils.configuration import ToolParameterConfigurationManager
+
             # get original app model config
-            original_app_model_config: AppModelConfig = db.session.query(AppModelConfig).filter(
-                AppModelConfig.id == app_model.app_model_config_id
-            ).first()
+            original_app_model_config: AppModelConfig = db.session.get(AppModelConfig, app_model.app_model_config_id)
             agent_mode = original_app_model_config.agent_mode_dict
             # decrypt agent tool parameters if it's secret-input
             parameter_map = {}
@@ -132,13 +132,15 @@ class ModelConfigResource(Resource):
         db.session.flush()
 
         app_model.app_model_config_id = new_app_model_config.id
-        db.session.commit()
 
+        # the signal handler only stages the app dataset join changes, they are committed with the config below
         app_model_config_was_updated.send(
             app_model,
             app_model_config=new_app_model_config
         )
 
+        db.session.commit()
+
         return {'result': 'success'}
 
 
@@ -1,9 +1,25 @@
+import re
+import threading
+from collections.abc import Iterable
 from typing import Optional
 
+from cachetools import TTLCache
+
 from core.app.app_config.entities import DatasetEntity, DatasetRetrieveConfigEntity
 from core.entities.agent_entities import PlanningStrategy
 from models.model import AppMode
-from services.dataset_service import DatasetService
+
+_RELATED_CONFIG_KEYS = ("agent_mode", "dataset_configs", "dataset_query_variable")
+
+_ROUTER_STRATEGIES = frozenset({PlanningStrategy.ROUTER.value, PlanningStrategy.REACT_ROUTER.value})
+
+_UUID_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\Z')
+
+# tenant ids of existing datasets keyed by lowercase dataset id, missing datasets are not cached
+# so a dataset is never rejected once it exists. deleting a dataset only evicts it in the current process,
+# other workers may treat a deleted dataset as existing until their entry expires (ttl, 30s)
+_dataset_tenant_ids: TTLCache = TTLCache(maxsize=4096, ttl=30)
+_dataset_tenant_ids_lock = threading.Lock()
 
 
 class DatasetConfigManager:
@@ -45,7 +61,7 @@ class DatasetConfigManager:
                 keys = tool.keys()
                 if len(keys) == 1:
                     # old standard
-                    key = list(tool.keys())[0]
+                    key = next(iter(tool))
 
                     if key != 'dataset':
                         continue
@@ -90,7 +106,9 @@ class DatasetConfigManager:
             )
 
     @classmethod
-    def validate_and_set_defaults(cls, tenant_id: str, app_mode: AppMode, config: dict) -> tuple[dict, list[str]]:
+    def validate_and_set_defaults(cls, tenant_id: str,
+                                  app_mode: AppMode,
+                                  config: dict) -> tuple[dict, tuple[str, ...]]:
         """
         Validate and set defaults for dataset feature
 
@@ -99,126 +117,154 @@ class DatasetConfigManager:
         :param config: app model config args
         """
         # Extract dataset config for legacy compatibility
-        config = cls.extract_dataset_config_for_legacy_compatibility(tenant_id, app_mode, config)
+        config, has_agent_datasets = cls.extract_dataset_config_for_legacy_compatibility(tenant_id, app_mode, config)
 
         # dataset_configs
-        if not config.get("dataset_configs"):
-            config["dataset_configs"] = {'retrieval_model': 'single'}
+        dataset_configs = config.get("dataset_configs")
+        if not dataset_configs:
+            dataset_configs = config["dataset_configs"] = {'retrieval_model': 'single'}
+
+        if not isinstance(dataset_configs, dict):
+            raise ValueError("dataset_configs must be of object type")
 
-        if not config["dataset_configs"].get("datasets"):
-            config["dataset_configs"]["datasets"] = {
+        datasets = dataset_configs.get("datasets")
+        if not datasets:
+            datasets = dataset_configs["datasets"] = {
                 "strategy": "router",
                 "datasets": []
             }
 
-        if not isinstance(config["dataset_configs"], dict):
-            raise ValueError("dataset_configs must be of object type")
-
-        if config["dataset_configs"]['retrieval_model'] == 'multiple':
-            if not config["dataset_configs"]['reranking_model']:
+        if dataset_configs['retrieval_model'] == 'multiple':
+            reranking_model = dataset_configs['reranking_model']
+            if not reranking_model:
                 raise ValueError("reranking_model has not been set")
-            if not isinstance(config["dataset_configs"]['reranking_model'], dict):
+            if not isinstance(reranking_model, dict):
                 raise ValueError("reranking_model must be of object type")
 
-        if not isinstance(config["dataset_configs"], dict):
-            raise ValueError("dataset_configs must be of object type")
-
-        need_manual_query_datasets = (config.get("dataset_configs")
-                                      and config["dataset_configs"].get("datasets", {}).get("datasets"))
-
-        if need_manual_query_datasets and app_mode == AppMode.COMPLETION:
+        if app_mode == AppMode.COMPLETION:
             # Only check when mode is completion
-            dataset_query_variable = config.get("dataset_query_variable")
+            need_manual_query_datasets = has_agent_datasets or bool(datasets.get("datasets"))
+            cls._validate_completion_query_variable(config, need_manual_query_datasets)
 
-            if not dataset_query_variable:
-                raise ValueError("Dataset query variable is required when dataset is exist")
-
-        return config, ["agent_mode", "dataset_configs", "dataset_query_variable"]
+        return config, _RELATED_CONFIG_KEYS
 
     @classmethod
-    def extract_dataset_config_for_legacy_compatibility(cls, tenant_id: str, app_mode: AppMode, config: dict) -> dict:
+    def extract_dataset_config_for_legacy_compatibility(cls, tenant_id: str,
+                                                        app_mode: AppMode,
+                                                        config: dict) -> tuple[dict, bool]:
         """
         Extract dataset config for legacy compatibility
 
         :param tenant_id: tenant ID
         :param app_mode: app mode
         :param config: app model config args
+        :return: config, and whether the enabled agent mode has datasets which need manual query
         """
         # Extract dataset config for legacy compatibility
-        if not config.get("agent_mode"):
-            config["agent_mode"] = {
+        agent_mode = config.get("agent_mode")
+        if not agent_mode:
+            agent_mode = config["agent_mode"] = {
                 "enabled": False,
                 "tools": []
             }
 
-        if not isinstance(config["agent_mode"], dict):
+        if not isinstance(agent_mode, dict):
             raise ValueError("agent_mode must be of object type")
 
         # enabled
-        if "enabled" not in config["agent_mode"] or not config["agent_mode"]["enabled"]:
-            config["agent_mode"]["enabled"] = False
+        enabled = agent_mode.get("enabled")
+        if not enabled:
+            enabled = agent_mode["enabled"] = False
 
-        if not isinstance(config["agent_mode"]["enabled"], bool):
+        if not isinstance(enabled, bool):
             raise ValueError("enabled in agent_mode must be of boolean type")
 
         # tools
-        if not config["agent_mode"].get("tools"):
-            config["agent_mode"]["tools"] = []
+        tools = agent_mode.get("tools")
+        if not tools:
+            tools = agent_mode["tools"] = []
 
-        if not isinstance(config["agent_mode"]["tools"], list):
+        if not isinstance(tools, list):
             raise ValueError("tools in agent_mode must be a list of objects")
 
         # strategy
-        if not config["agent_mode"].get("strategy"):
-            config["agent_mode"]["strategy"] = PlanningStrategy.ROUTER.value
+        strategy = agent_mode.get("strategy")
+        if not strategy:
+            strategy = agent_mode["strategy"] = PlanningStrategy.ROUTER.value
 
         has_datasets = False
-        if config["agent_mode"]["strategy"] in [PlanningStrategy.ROUTER.value, PlanningStrategy.REACT_ROUTER.value]:
-            for tool in config["agent_mode"]["tools"]:
-                key = list(tool.keys())[0]
+        dataset_ids: set[str] = set()
+        if strategy in _ROUTER_STRATEGIES:
+            for tool in tools:
+                # empty tools have no key and are skipped
+                key = next(iter(tool), None)
                 if key == "dataset":
                     # old style, use tool name as key
                     tool_item = tool[key]
 
-                    if "enabled" not in tool_item or not tool_item["enabled"]:
+                    if not tool_item.get("enabled"):
                         tool_item["enabled"] = False
-
-                    if not isinstance(tool_item["enabled"], bool):
+                    elif not isinstance(tool_item["enabled"], bool):
                         raise ValueError("enabled in agent_mode.tools must be of boolean type")
 
                     if 'id' not in tool_item:
                         raise ValueError("id is required in dataset")
 
-                    try:
-                        uuid.UUID(tool_item["id"])
-                    except ValueError:
+                    dataset_id = tool_item["id"]
+                    if not isinstance(dataset_id, str) or not _UUID_PATTERN.match(dataset_id):
                         raise ValueError("id in dataset must be of UUID type")
 
-                    if not cls.is_dataset_exists(tenant_id, tool_item["id"]):
-                        raise ValueError("Dataset ID does not exist, please check your permission.")
-
+                    dataset_ids.add(dataset_id)
                     has_datasets = True
 
-        need_manual_query_datasets = has_datasets and config["agent_mode"]["enabled"]
+        if dataset_ids and not cls.is_datasets_exist(tenant_id, dataset_ids):
+            raise ValueError("Dataset ID does not exist, please check your permission.")
 
-        if need_manual_query_datasets and app_mode == AppMode.COMPLETION:
-            # Only check when mode is completion
-            dataset_query_variable = config.get("dataset_query_variable")
+        return config, has_datasets and enabled
 
-            if not dataset_query_variable:
-                raise ValueError("Dataset query variable is required when dataset is exist")
+    @classmethod
+    def _validate_completion_query_variable(cls, config: dict, need_manual_query_datasets: bool) -> None:
+        """
+        Validate dataset query variable of completion app
 
-        return config
+        :param config: app model config args
+        :param need_manual_query_datasets: whether the app has datasets which need manual query
+        """
+        if need_manual_query_datasets and not config.get("dataset_query_variable"):
+            raise ValueError("Dataset query variable is required when dataset is exist")
 
     @classmethod
-    def is_dataset_exists(cls, tenant_id: str, dataset_id: str) -> bool:
-        # verify if the dataset ID exists
-        dataset = DatasetService.get_dataset(dataset_id)
+    def is_datasets_exist(cls, tenant_id: str, dataset_ids: Iterable[str]) -> bool:
+        """
+        Verify if all the dataset IDs exist in tenant, with a single query for the uncached ones
 
-        if not dataset:
-            return False
+        :param tenant_id: tenant ID
+        :param dataset_ids: dataset IDs
+        """
+        # dataset ids are cached in lowercase as they are returned from database
+        dataset_ids = {dataset_id.lower() for dataset_id in dataset_ids}
+        with _dataset_tenant_ids_lock:
+            uncached_dataset_ids = {dataset_id for dataset_id in dataset_ids
+                                    if _dataset_tenant_ids.get(dataset_id) != tenant_id}
 
-        if dataset.tenant_id != tenant_id:
-            return False
+        if not uncached_dataset_ids:
+            return True
 
-        return True
+        from services.dataset_service import DatasetService
+
+        exist_dataset_ids = DatasetService.get_exist_dataset_ids(tenant_id, list(uncached_dataset_ids))
+        with _dataset_tenant_ids_lock:
+            for dataset_id in exist_dataset_ids:
+                _dataset_tenant_ids[dataset_id.lower()] = tenant_id
+
+        return len(exist_dataset_ids) == len(uncached_dataset_ids)
+
+    @classmethod
+    def delete_dataset_cache(cls, dataset_id: str) -> None:
+        """
+        Delete cached tenant id of dataset, only in the current process
+
+        :param dataset_id: dataset ID
+        """
+        with _dataset_tenant_ids_lock:
+            _dataset_tenant_ids.pop(dataset_id.lower(), None)
@@ -1,13 +1,14 @@
-import json
 from collections.abc import Generator
-from typing import cast
+from typing import Union, cast
 
 from core.app.apps.base_app_generate_response_converter import AppGenerateResponseConverter
 from core.app.entities.task_entities import (
+    AgentMessageStreamResponse,
     ChatbotAppBlockingResponse,
     ChatbotAppStreamResponse,
     ErrorStreamResponse,
     MessageEndStreamResponse,
+    MessageStreamResponse,
     PingStreamResponse,
 )
 
@@ -52,12 +53,13 @@ class AdvancedChatAppGenerateResponseConverter(AppGenerateResponseConverter):
 
     @classmethod
     def convert_stream_full_response(cls, stream_response: Generator[ChatbotAppStreamResponse, None, None]) \
-            -> Generator[str, None, None]:
+            -> Generator[Union[bytes, str], None, None]:
         """
         Convert stream full response.
         :param stream_response: stream response
         :return:
         """
+        frame_prefixes = {}
         for chunk in stream_response:
             chunk = cast(ChatbotAppStreamResponse, chunk)
             sub_stream_response = chunk.stream_response
@@ -73,21 +75,26 @@ class AdvancedChatAppGenerateResponseConverter(AppGenerateResponseConverter):
                 'created_at': chunk.created_at
             }
 
+            if isinstance(sub_stream_response, MessageStreamResponse | AgentMessageStreamResponse):
+                yield cls._message_chunk_to_bytes(frame_prefixes, response_chunk, sub_stream_response)
+                continue
+
             if isinstance(sub_stream_response, ErrorStreamResponse):
                 data = cls._error_to_stream_response(sub_stream_response.err)
                 response_chunk.update(data)
             else:
                 response_chunk.update(sub_stream_response.to_dict())
-            yield json.dumps(response_chunk)
+            yield cls._dumps(response_chunk)
 
     @classmethod
     def convert_stream_simple_response(cls, stream_response: Generator[ChatbotAppStreamResponse, None, None]) \
-            -> Generator[str, None, None]:
+            -> Generator[Union[bytes, str], None, None]:
         """
         Convert stream simple response.
         :param stream_response: stream response
         :return:
         """
+        frame_prefixes = {}
         for chunk in stream_response:
             chunk = cast(ChatbotAppStreamResponse, chunk)
             sub_stream_response = chunk.stream_response
@@ -103,6 +110,10 @@ class AdvancedChatAppGenerateResponseConverter(AppGenerateResponseConverter):
                 'created_at': chunk.created_at
             }
 
+            if isinstance(sub_stream_response, MessageStreamResponse | AgentMessageStreamResponse):
+                yield cls._message_chunk_to_bytes(frame_prefixes, response_chunk, sub_stream_response)
+                continue
+
             if isinstance(sub_stream_response, MessageEndStreamResponse):
                 sub_stream_response_dict = sub_stream_response.to_dict()
                 metadata = sub_stream_response_dict.get('metadata', {})
@@ -114,4 +125,4 @@ class AdvancedChatAppGenerateResponseConverter(AppGenerateResponseConverter):
             else:
                 response_chunk.update(sub_stream_response.to_dict())
 
-            yield json.dumps(response_chunk)
+            yield cls._dumps(response_chunk)
@@ -1,14 +1,18 @@
 import json
 import logging
 import time
-from collections.abc import Generator
+from collections.abc import Callable, Generator
 from typing import Any, Optional, Union, cast
 
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
 from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
 from core.app.entities.app_invoke_entities import (
     AdvancedChatAppGenerateEntity,
 )
 from core.app.entities.queue_entities import (
+    AppQueueEvent,
     QueueAdvancedChatMessageEndEvent,
     QueueAnnotationReplyEvent,
     QueueErrorEvent,
@@ -31,6 +35,7 @@ from core.app.entities.task_entities import (
     ChatflowStreamGenerateRoute,
     ErrorStreamResponse,
     MessageEndStreamResponse,
+    MessageStreamResponse,
     StreamResponse,
 )
 from core.app.task_pipeline.based_generate_task_pipeline import BasedGenerateTaskPipeline
@@ -48,7 +53,6 @@ from models.account import Account
 from models.model import Conversation, EndUser, Message
 from models.workflow import (
     Workflow,
-    WorkflowNodeExecution,
     WorkflowRunStatus,
 )
 
@@ -65,6 +69,10 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
     _user: Union[Account, EndUser]
     _workflow_system_variables: dict[SystemVariable, Any]
 
+    # coalesce consecutive message chunks until either bound is reached
+    _CHUNK_FLUSH_CHARS = 4096
+    _CHUNK_FLUSH_INTERVAL = 0.01
+
     def __init__(self, application_generate_entity: AdvancedChatAppGenerateEntity,
                  workflow: Workflow,
                  queue_manager: AppQueueManager,
@@ -92,6 +100,7 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
         self._workflow = workflow
         self._conversation = conversation
         self._message = message
+        self._message_created_at = int(message.created_at.timestamp())
         self._workflow_system_variables = {
             SystemVariable.QUERY: message.query,
             SystemVariable.FILES: application_generate_entity.files,
@@ -104,8 +113,21 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
         )
 
         self._stream_generate_routes = self._get_stream_generate_routes()
+        self._workflow_run = None
+        self._workflow_run_created_at = None
+        self._workflow_node_executions = {}
+        self._workflow_node_execution_outputs = {}
+        self._workflow_node_execution_static_data = {}
+        self._annotation_replies = {}
         self._conversation_name_generate_thread = None
 
+        self._stream_handlers = self._init_stream_handlers()
+
+        self._answer_parts: list[str] = []
+        self._pending_buf: list[str] = []
+        self._pending_chars = 0
+        self._last_flush_at = time.monotonic()
+
     def process(self) -> Union[ChatbotAppBlockingResponse, Generator[ChatbotAppStreamResponse, None, None]]:
         """
         Process generate task pipeline.
@@ -149,7 +171,7 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
                         conversation_id=self._conversation.id,
                         message_id=self._message.id,
                         answer=self._task_state.answer,
-                        created_at=int(self._message.created_at.timestamp()),
+                        created_at=self._message_created_at,
                         **extras
                     )
                 )
@@ -168,7 +190,7 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
             yield ChatbotAppStreamResponse(
                 conversation_id=self._conversation.id,
                 message_id=self._message.id,
-                created_at=int(self._message.created_at.timestamp()),
+                created_at=self._message_created_at,
                 stream_response=stream_response
             )
 
@@ -177,149 +199,310 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
         Process stream response.
         :return:
         """
-        for message in self._queue_manager.listen():
-            event = message.event
+        should_stop = False
+        for messages in self._queue_manager.listen_batch():
+            for message in messages:
+                event = message.event
+                event_type = type(event)
+
+                if event_type is not QueueTextChunkEvent:
+                    # flush pending chunks first to preserve the order of stream responses
+                    response = self._flush_chunks()
+                    if response:
+                        yield response
+
+                handler = self._stream_handlers.get(event_type)
+                if not handler:
+                    continue
 
-            if isinstance(event, QueueErrorEvent):
-                err = self._handle_error(event, self._message)
-                yield self._error_to_stream_response(err)
+                generator = handler(event)
+                if generator is None:
+                    continue
+
+                should_stop = yield from generator
+                if should_stop:
+                    break
+
+            if should_stop:
                 break
-            elif isinstance(event, QueueWorkflowStartedEvent):
-                workflow_run = self._handle_workflow_start()
 
-                self._message = db.session.query(Message).filter(Message.id == self._message.id).first()
-                self._message.workflow_run_id = workflow_run.id
+        # flush the rest chunks when listening stopped without a final event
+        response = self._flush_chunks()
+        if response:
+            yield response
 
-                db.session.commit()
-                db.session.refresh(self._message)
-                db.session.close()
+        if self._conversation_name_generate_thread:
+            self._conversation_name_generate_thread.join()
 
-                yield self._workflow_start_to_stream_response(
-                    task_id=self._application_generate_entity.task_id,
-                    workflow_run=workflow_run
-                )
-            elif isinstance(event, QueueNodeStartedEvent):
-                workflow_node_execution = self._handle_node_start(event)
+    def _init_stream_handlers(self) -> dict[type[AppQueueEvent], Callable]:
+        """
+        Init stream handlers keyed by event type.
+        A handler returns None if there is nothing to stream, otherwise a generator of stream responses
+        whose return value indicates whether to stop listening.
+        :return:
+        """
+        return {
+            QueueErrorEvent: self._on_error,
+            QueueWorkflowStartedEvent: self._on_workflow_started,
+            QueueNodeStartedEvent: self._on_node_started,
+            QueueNodeSucceededEvent: self._on_node_finished,
+            QueueNodeFailedEvent: self._on_node_finished,
+            QueueStopEvent: self._on_workflow_finished,
+            QueueWorkflowSucceededEvent: self._on_workflow_finished,
+            QueueWorkflowFailedEvent: self._on_workflow_finished,
+            QueueAdvancedChatMessageEndEvent: self._on_message_end,
+            QueueRetrieverResourcesEvent: self._handle_retriever_resources,
+            QueueAnnotationReplyEvent: self._on_annotation_reply,
+            QueueTextChunkEvent: self._on_text_chunk,
+            QueueMessageReplaceEvent: self._on_message_replace,
+            QueuePingEvent: self._on_ping,
+        }
 
-                # search stream_generate_routes if node id is answer start at node
-                if not self._task_state.current_stream_generate_state and event.node_id in self._stream_generate_routes:
-                    self._task_state.current_stream_generate_state = self._stream_generate_routes[event.node_id]
+    def _on_error(self, event: QueueErrorEvent) -> Generator[StreamResponse, None, bool]:
+        """
+        Handle error event.
+        :param event: event
+        :return:
+        """
+        err = self._handle_error(event, self._message)
+        yield self._error_to_stream_response(err)
+        return True
 
-                    # generate stream outputs when node started
-                    yield from self._generate_stream_outputs_when_node_started()
+    def _on_workflow_started(self, event: QueueWorkflowStartedEvent) -> Generator[StreamResponse, None, bool]:
+        """
+        Handle workflow started event.
+        :param event: event
+        :return:
+        """
+        workflow_run = self._handle_workflow_start()
 
-                yield self._workflow_node_start_to_stream_response(
-                    event=event,
-                    task_id=self._application_generate_entity.task_id,
-                    workflow_node_execution=workflow_node_execution
-                )
-            elif isinstance(event, QueueNodeSucceededEvent | QueueNodeFailedEvent):
-                workflow_node_execution = self._handle_node_finished(event)
+        self._message = db.session.get(Message, self._message.id)
+        self._message.workflow_run_id = workflow_run.id
 
-                # stream outputs when node finished
-                generator = self._generate_stream_outputs_when_node_finished()
-                if generator:
-                    yield from generator
+        db.session.commit()
+        db.session.refresh(self._message)
+        db.session.close()
 
-                yield self._workflow_node_finish_to_stream_response(
-                    task_id=self._application_generate_entity.task_id,
-                    workflow_node_execution=workflow_node_execution
-                )
-            elif isinstance(event, QueueStopEvent | QueueWorkflowSucceededEvent | QueueWorkflowFailedEvent):
-                workflow_run = self._handle_workflow_finished(event)
-                if workflow_run:
-                    yield self._workflow_finish_to_stream_response(
-                        task_id=self._application_generate_entity.task_id,
-                        workflow_run=workflow_run
-                    )
+        yield self._workflow_start_to_stream_response(
+            task_id=self._application_generate_entity.task_id,
+            workflow_run=workflow_run
+        )
+        return False
 
-                    if workflow_run.status == WorkflowRunStatus.FAILED.value:
-                        err_event = QueueErrorEvent(error=ValueError(f'Run failed: {workflow_run.error}'))
-                        yield self._error_to_stream_response(self._handle_error(err_event, self._message))
-                        break
+    def _on_node_started(self, event: QueueNodeStartedEvent) -> Generator[StreamResponse, None, bool]:
+        """
+        Handle node started event.
+        :param event: event
+        :return:
+        """
+        workflow_node_execution = self._handle_node_start(event)
 
-                if isinstance(event, QueueStopEvent):
-                    # Save message
-                    self._save_message()
+        # search stream_generate_routes if node id is answer start at node
+        if not self._task_state.current_stream_generate_state and event.node_id in self._stream_generate_routes:
+            self._task_state.current_stream_generate_state = self._stream_generate_routes[event.node_id]
 
-                    yield self._message_end_to_stream_response()
-                    break
-                else:
-                    self._queue_manager.publish(
-                        QueueAdvancedChatMessageEndEvent(),
-                        PublishFrom.TASK_PIPELINE
-                    )
-            elif isinstance(event, QueueAdvancedChatMessageEndEvent):
-                output_moderation_answer = self._handle_output_moderation_when_task_finished(self._task_state.answer)
-                if output_moderation_answer:
-                    self._task_state.answer = output_moderation_answer
-                    yield self._message_replace_to_stream_response(answer=output_moderation_answer)
-
-                # Save message
-                self._save_message()
-
-                yield self._message_end_to_stream_response()
-            elif isinstance(event, QueueRetrieverResourcesEvent):
-                self._handle_retriever_resources(event)
-            elif isinstance(event, QueueAnnotationReplyEvent):
-                self._handle_annotation_reply(event)
-            # elif isinstance(event, QueueMessageFileEvent):
-            #     response = self._message_file_to_stream_response(event)
-            #     if response:
-            #         yield response
-            elif isinstance(event, QueueTextChunkEvent):
-                delta_text = event.text
-                if delta_text is None:
-                    continue
+            # generate stream outputs when node started
+            yield from self._generate_stream_outputs_when_node_started()
 
-                if not self._is_stream_out_support(
-                        event=event
-                ):
-                    continue
+        yield self._workflow_node_start_to_stream_response(
+            event=event,
+            task_id=self._application_generate_entity.task_id,
+            workflow_node_execution=workflow_node_execution
+        )
+        return False
 
-                # handle output moderation chunk
-                should_direct_answer = self._handle_output_moderation_chunk(delta_text)
-                if should_direct_answer:
-                    continue
+    def _on_node_finished(self, event: QueueNodeSucceededEvent | QueueNodeFailedEvent) \
+            -> Generator[StreamResponse, None, bool]:
+        """
+        Handle node finished event.
+        :param event: event
+        :return:
+        """
+        workflow_node_execution = self._handle_node_finished(event)
 
-                self._task_state.answer += delta_text
-                yield self._message_to_stream_response(delta_text, self._message.id)
-            elif isinstance(event, QueueMessageReplaceEvent):
-                yield self._message_replace_to_stream_response(answer=event.text)
-            elif isinstance(event, QueuePingEvent):
-                yield self._ping_stream_response()
-            else:
-                continue
+        # stream outputs when node finished
+        generator = self._generate_stream_outputs_when_node_finished()
+        if generator:
+            yield from generator
 
-        if self._conversation_name_generate_thread:
-            self._conversation_name_generate_thread.join()
+        yield self._workflow_node_finish_to_stream_response(
+            task_id=self._application_generate_entity.task_id,
+            workflow_node_execution=workflow_node_execution
+        )
+        return False
 
-    def _save_message(self) -> None:
+    def _on_workflow_finished(self, event: QueueStopEvent | QueueWorkflowSucceededEvent | QueueWorkflowFailedEvent) \
+            -> Generator[StreamResponse, None, bool]:
         """
-        Save message.
+        Handle workflow finished event.
+        :param event: event
         :return:
         """
-        self._message = db.session.query(Message).filter(Message.id == self._message.id).first()
+        workflow_run = self._handle_workflow_finished(event)
+        if workflow_run:
+            yield self._workflow_finish_to_stream_response(
+                task_id=self._application_generate_entity.task_id,
+                workflow_run=workflow_run
+            )
 
-        self._message.answer = self._task_state.answer
-        self._message.provider_response_latency = time.perf_counter() - self._start_at
-        self._message.message_metadata = json.dumps(jsonable_encoder(self._task_state.metadata)) \
-            if self._task_state.metadata else None
+            if workflow_run.status == WorkflowRunStatus.FAILED.value:
+                err_event = QueueErrorEvent(error=ValueError(f'Run failed: {workflow_run.error}'))
+                yield self._error_to_stream_response(self._handle_error(err_event, self._message))
+                return True
 
-        if self._task_state.metadata and self._task_state.metadata.get('usage'):
-            usage = LLMUsage(**self._task_state.metadata['usage'])
+        if isinstance(event, QueueStopEvent):
+            yield from self._save_message_and_end()
+            return True
+
+        self._queue_manager.publish(
+            QueueAdvancedChatMessageEndEvent(),
+            PublishFrom.TASK_PIPELINE
+        )
+        return False
 
-            self._message.message_tokens = usage.prompt_tokens
-            self._message.message_unit_price = usage.prompt_unit_price
-            self._message.message_price_unit = usage.prompt_price_unit
-            self._message.answer_tokens = usage.completion_tokens
-            self._message.answer_unit_price = usage.completion_unit_price
-            self._message.answer_price_unit = usage.completion_price_unit
-            self._message.total_price = usage.total_price
-            self._message.currency = usage.currency
+    def _on_message_end(self, event: QueueAdvancedChatMessageEndEvent) -> Generator[StreamResponse, None, bool]:
+        """
+        Handle advanced chat message end event.
+        :param event: event
+        :return:
+        """
+        output_moderation_answer = self._handle_output_moderation_when_task_finished(self._materialize_answer())
+        if output_moderation_answer:
+            self._task_state.answer = output_moderation_answer
+            yield self._message_replace_to_stream_response(answer=output_moderation_answer)
 
+        yield from self._save_message_and_end()
+        return False
+
+    def _on_annotation_reply(self, event: QueueAnnotationReplyEvent) -> None:
+        """
+        Handle annotation reply event.
+        :param event: event
+        :return:
+        """
+        self._handle_annotation_reply(event)
+
+    def _on_text_chunk(self, event: QueueTextChunkEvent) -> Optional[Generator[StreamResponse, None, bool]]:
+        """
+        Handle text chunk event.
+        :param event: event
+        :return:
+        """
+        delta_text = event.text
+        if delta_text is None:
+            return None
+
+        if not self._is_stream_out_support(
+                event=event
+        ):
+            return None
+
+        # handle output moderation chunk
+        should_direct_answer = self._handle_output_moderation_chunk(delta_text)
+        if should_direct_answer:
+            return None
+
+        self._answer_parts.append(delta_text)
+        response = self._enqueue_chunk(delta_text)
+        if not response:
+            return None
+
+        return self._yield_stream_response(response)
+
+    def _on_message_replace(self, event: QueueMessageReplaceEvent) -> Generator[StreamResponse, None, bool]:
+        """
+        Handle message replace event.
+        :param event: event
+        :return:
+        """
+        return self._yield_stream_response(self._message_replace_to_stream_response(answer=event.text))
+
+    def _on_ping(self, event: QueuePingEvent) -> Generator[StreamResponse, None, bool]:
+        """
+        Handle ping event.
+        :param event: event
+        :return:
+        """
+        return self._yield_stream_response(self._ping_stream_response())
+
+    def _yield_stream_response(self, response: StreamResponse) -> Generator[StreamResponse, None, bool]:
+        """
+        Yield single stream response and keep listening.
+        :param response: stream response
+        :return:
+        """
+        yield response
+        return False
+
+    def _enqueue_chunk(self, text: str) -> Optional[MessageStreamResponse]:
+        """
+        Buffer message chunk, flush when the buffer is full or the flush interval is exceeded,
+        chunks are coalesced across batches of ready events.
+        The rest is flushed before the next non-chunk event.
+        :param text: text
+        :return:
+        """
+        self._pending_buf.append(text)
+        self._pending_chars += len(text)
+
+        if (self._pending_chars >= self._CHUNK_FLUSH_CHARS
+                or time.monotonic() - self._last_flush_at >= self._CHUNK_FLUSH_INTERVAL):
+            return self._flush_chunks()
+
+        return None
+
+    def _materialize_answer(self) -> str:
+        """
+        Join the answer parts collected so far into the task state answer.
+        :return:
+        """
+        if self._answer_parts:
+            self._task_state.answer += ''.join(self._answer_parts)
+            self._answer_parts.clear()
+
+        return self._task_state.answer
+
+    def _flush_chunks(self) -> Optional[MessageStreamResponse]:
+        """
+        Flush buffered message chunks into a single message stream response.
+        :return:
+        """
+        self._last_flush_at = time.monotonic()
+        if not self._pending_buf:
+            return None
+
+        text = ''.join(self._pending_buf)
+        self._pending_buf = []
+        self._pending_chars = 0
+
+        return self._message_to_stream_response(text, self._message.id)
+
+    def _save_message_and_end(self) -> Generator[StreamResponse, None, None]:
+        """
+        Save message and yield message end stream response.
+        The message is saved before the message end, clients may read the message as soon as they receive it.
+        :return:
+        """
+        self._materialize_answer()
+        self._save_message()
+
+        yield self._message_end_to_stream_response()
+
+    def _save_message(self) -> None:
+        """
+        Save message.
+        :return:
+        """
+        values = self._get_message_values()
+        db.session.execute(
+            update(Message).where(Message.id == self._message.id).values(**values)
+        )
         db.session.commit()
 
+        # keep the message in sync for the receivers without marking it dirty
+        for key, value in values.items():
+            set_committed_value(self._message, key, value)
+
         message_was_created.send(
             self._message,
             application_generate_entity=self._application_generate_entity,
@@ -328,6 +511,34 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
             extras=self._application_generate_entity.extras
         )
 
+    def _get_message_values(self) -> dict:
+        """
+        Get message values to save from the task state.
+        :return:
+        """
+        values = {
+            'answer': self._task_state.answer,
+            'provider_response_latency': time.perf_counter() - self._start_at,
+            'message_metadata': json.dumps(jsonable_encoder(self._task_state.metadata))
+            if self._task_state.metadata else None
+        }
+
+        if self._task_state.metadata and self._task_state.metadata.get('usage'):
+            usage = LLMUsage(**self._task_state.metadata['usage'])
+
+            values.update({
+                'message_tokens': usage.prompt_tokens,
+                'message_unit_price': usage.prompt_unit_price,
+                'message_price_unit': usage.prompt_price_unit,
+                'answer_tokens': usage.completion_tokens,
+                'answer_unit_price': usage.completion_unit_price,
+                'answer_price_unit': usage.completion_price_unit,
+                'total_price': usage.total_price,
+                'currency': usage.currency,
+            })
+
+        return values
+
     def _message_end_to_stream_response(self) -> MessageEndStreamResponse:
         """
         Message end to stream response.
@@ -436,7 +647,7 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
                     if should_direct_answer:
                         continue
 
-                    self._task_state.answer += route_chunk.text
+                    self._answer_parts.append(route_chunk.text)
                     yield self._message_to_stream_response(route_chunk.text, self._message.id)
                 else:
                     break
@@ -462,7 +673,7 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
         for route_chunk in route_chunks:
             if route_chunk.type == 'text':
                 route_chunk = cast(TextGenerateRouteChunk, route_chunk)
-                self._task_state.answer += route_chunk.text
+                self._answer_parts.append(route_chunk.text)
                 yield self._message_to_stream_response(route_chunk.text, self._message.id)
             else:
                 route_chunk = cast(VarGenerateRouteChunk, route_chunk)
@@ -491,11 +702,10 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
                         self._task_state.current_stream_generate_state.current_route_position += 1
                         continue
 
-                    # get route chunk node execution
-                    route_chunk_node_execution = db.session.query(WorkflowNodeExecution).filter(
-                        WorkflowNodeExecution.id == route_chunk_node_execution_info.workflow_node_execution_id).first()
-
-                    outputs = route_chunk_node_execution.outputs_dict
+                    # get route chunk node execution outputs
+                    outputs = self._get_workflow_node_execution_outputs(
+                        route_chunk_node_execution_info.workflow_node_execution_id
+                    )
 
                     # get value from outputs
                     value = None
@@ -548,7 +758,7 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
                             text = json.dumps(value, ensure_ascii=False)
 
                     if text:
-                        self._task_state.answer += text
+                        self._answer_parts.append(text)
                         yield self._message_to_stream_response(text, self._message.id)
 
             self._task_state.current_stream_generate_state.current_route_position += 1
@@ -597,28 +807,12 @@ class AdvancedChatAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCyc
 
         return True
 
-    def _handle_output_moderation_chunk(self, text: str) -> bool:
+    def _handle_output_moderation_direct_output(self, final_output: str) -> None:
         """
-        Handle output moderation chunk.
-        :param text: text
-        :return: True if output moderation should direct output, otherwise False
-        """
-        if self._output_moderation_handler:
-            if self._output_moderation_handler.should_direct_output():
-                # stop subscribe new token when output moderation should direct output
-                self._task_state.answer = self._output_moderation_handler.get_final_output()
-                self._queue_manager.publish(
-                    QueueTextChunkEvent(
-                        text=self._task_state.answer
-                    ), PublishFrom.TASK_PIPELINE
-                )
-
-                self._queue_manager.publish(
-                    QueueStopEvent(stopped_by=QueueStopEvent.StopBy.OUTPUT_MODERATION),
-                    PublishFrom.TASK_PIPELINE
-                )
-                return True
-            else:
-                self._output_moderation_handler.append_new_token(text)
-
-        return False
+        Replace the answer with the output moderation final output and publish it.
+        :param final_output: final output
+        :return:
+        """
+        self._answer_parts.clear()
+        self._task_state.answer = final_output
+        super()._handle_output_moderation_direct_output(final_output)
@@ -197,8 +197,13 @@ class AgentChatAppConfigManager(BaseAppConfigManager):
         if not isinstance(config["agent_mode"]["tools"], list):
             raise ValueError("tools in agent_mode must be a list of objects")
 
+        dataset_ids: set[str] = set()
         for tool in config["agent_mode"]["tools"]:
-            key = list(tool.keys())[0]
+            key = next(iter(tool), None)
+            if key is None:
+                # skip empty tools
+                continue
+
             if key in OLD_TOOLS:
                 # old style, use tool name as key
                 tool_item = tool[key]
@@ -218,8 +223,7 @@ class AgentChatAppConfigManager(BaseAppConfigManager):
                     except ValueError:
                         raise ValueError("id in dataset must be of UUID type")
 
-                    if not DatasetConfigManager.is_dataset_exists(tenant_id, tool_item["id"]):
-                        raise ValueError("Dataset ID does not exist, please check your permission.")
+                    dataset_ids.add(tool_item["id"])
             else:
                 # latest style, use key-value pair
                 if "enabled" not in tool or not tool["enabled"]:
@@ -233,4 +237,7 @@ class AgentChatAppConfigManager(BaseAppConfigManager):
                 if "tool_parameters" not in tool:
                     raise ValueError("tool_parameters is required in agent_mode.tools")
 
+        if dataset_ids and not DatasetConfigManager.is_datasets_exist(tenant_id, dataset_ids):
+            raise ValueError("Dataset ID does not exist, please check your permission.")
+
         return config, ["agent_mode"]
@@ -1,49 +1,75 @@
 import logging
 from abc import ABC, abstractmethod
 from collections.abc import Generator
-from typing import Union
+from operator import itemgetter
+from typing import ClassVar, Union
+
+import orjson
 
 from core.app.entities.app_invoke_entities import InvokeFrom
-from core.app.entities.task_entities import AppBlockingResponse, AppStreamResponse
+from core.app.entities.task_entities import (
+    AgentMessageStreamResponse,
+    AppBlockingResponse,
+    AppStreamResponse,
+    MessageStreamResponse,
+)
 from core.errors.error import ModelCurrentlyNotSupportError, ProviderTokenNotInitError, QuotaExceededError
 from core.model_runtime.errors.invoke import InvokeError
 
+_SIMPLE_RETRIEVER_RESOURCE_FIELDS = ('segment_id', 'position', 'document_name', 'score', 'content')
+_get_simple_retriever_resource_values = itemgetter(*_SIMPLE_RETRIEVER_RESOURCE_FIELDS)
+
 
 class AppGenerateResponseConverter(ABC):
     _blocking_response_type: type[AppBlockingResponse]
 
+    _PING_EVENT: ClassVar[bytes] = b'event: ping\n\n'
+
+    _ERROR_RESPONSES: ClassVar[tuple[tuple[type[Exception], dict], ...]] = (
+        (ValueError, {'code': 'invalid_param', 'status': 400}),
+        (ProviderTokenNotInitError, {'code': 'provider_not_initialize', 'status': 400}),
+        (QuotaExceededError, {
+            'code': 'provider_quota_exceeded',
+            'message': "Your quota for Dify Hosted Model Provider has been exhausted. "
+                       "Please go to Settings -> Model Provider to complete your own provider credentials.",
+            'status': 400
+        }),
+        (ModelCurrentlyNotSupportError, {'code': 'model_currently_not_support', 'status': 400}),
+        (InvokeError, {'code': 'completion_request_error', 'status': 400}),
+    )
+
     @classmethod
     def convert(cls, response: Union[
         AppBlockingResponse,
         Generator[AppStreamResponse, None, None]
     ], invoke_from: InvokeFrom) -> Union[
         dict,
-        Generator[str, None, None]
+        Generator[bytes, None, None]
     ]:
         if invoke_from in [InvokeFrom.DEBUGGER, InvokeFrom.SERVICE_API]:
             if isinstance(response, cls._blocking_response_type):
                 return cls.convert_blocking_full_response(response)
             else:
-                def _generate():
-                    for chunk in cls.convert_stream_full_response(response):
-                        if chunk == 'ping':
-                            yield f'event: {chunk}\n\n'
-                        else:
-                            yield f'data: {chunk}\n\n'
-
-                return _generate()
+                return cls._to_event_stream(cls.convert_stream_full_response(response))
         else:
             if isinstance(response, cls._blocking_response_type):
                 return cls.convert_blocking_simple_response(response)
             else:
-                def _generate():
-                    for chunk in cls.convert_stream_simple_response(response):
-                        if chunk == 'ping':
-                            yield f'event: {chunk}\n\n'
-                        else:
-                            yield f'data: {chunk}\n\n'
+                return cls._to_event_stream(cls.convert_stream_simple_response(response))
 
-                return _generate()
+    @classmethod
+    def _to_event_stream(cls, chunks: Generator[Union[bytes, str], None, None]) -> Generator[bytes, None, None]:
+        """
+        Frame converted stream response chunks as server-sent events.
+        :param chunks: converted stream response chunks
+        :return:
+        """
+        ping_event = cls._PING_EVENT
+        for chunk in chunks:
+            if chunk == 'ping':
+                yield ping_event
+            else:
+                yield b'data: ' + chunk + b'\n\n'
 
     @classmethod
     @abstractmethod
@@ -58,15 +84,52 @@ class AppGenerateResponseConverter(ABC):
     @classmethod
     @abstractmethod
     def convert_stream_full_response(cls, stream_response: Generator[AppStreamResponse, None, None]) \
-            -> Generator[str, None, None]:
+            -> Generator[Union[bytes, str], None, None]:
         raise NotImplementedError
 
     @classmethod
     @abstractmethod
     def convert_stream_simple_response(cls, stream_response: Generator[AppStreamResponse, None, None]) \
-            -> Generator[str, None, None]:
+            -> Generator[Union[bytes, str], None, None]:
         raise NotImplementedError
 
+    @classmethod
+    def _dumps(cls, data: dict) -> bytes:
+        """
+        Serialize stream response chunk.
+        :param data: stream response chunk
+        :return:
+        """
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+
+    @classmethod
+    def _message_chunk_to_bytes(cls, frame_prefixes: dict[tuple, bytes],
+                                response_chunk: dict,
+                                sub_stream_response: Union[MessageStreamResponse, AgentMessageStreamResponse]) \
+            -> bytes:
+        """
+        Message chunk to bytes.
+        Only the answer differs between message chunks of a stream,
+        so the rest of the frame is serialized once and reused as prefix.
+        :param frame_prefixes: serialized frame prefixes of the stream
+        :param response_chunk: response chunk without stream response fields
+        :param sub_stream_response: message stream response
+        :return:
+        """
+        key = (*response_chunk.values(), sub_stream_response.task_id, sub_stream_response.id)
+        prefix = frame_prefixes.get(key)
+        if prefix is None:
+            response_chunk.update({
+                'task_id': sub_stream_response.task_id,
+                'id': sub_stream_response.id
+            })
+
+            # strip the closing brace, the answer is appended on every chunk
+            prefix = cls._dumps(response_chunk)[:-1] + b',"answer":'
+            frame_prefixes[key] = prefix
+
+        return prefix + orjson.dumps(sub_stream_response.answer) + b'}'
+
     @classmethod
     def _get_simple_metadata(cls, metadata: dict) -> dict:
         """
@@ -76,15 +139,10 @@ class AppGenerateResponseConverter(ABC):
         """
         # show_retrieve_source
         if 'retriever_resources' in metadata:
-            metadata['retriever_resources'] = []
-            for resource in metadata['retriever_resources']:
-                metadata['retriever_resources'].append({
-                    'segment_id': resource['segment_id'],
-                    'position': resource['position'],
-                    'document_name': resource['document_name'],
-                    'score': resource['score'],
-                    'content': resource['content'],
-                })
+            metadata['retriever_resources'] = [
+                dict(zip(_SIMPLE_RETRIEVER_RESOURCE_FIELDS, _get_simple_retriever_resource_values(resource)))
+                for resource in metadata['retriever_resources']
+            ]
 
         # show annotation reply
         if 'annotation_reply' in metadata:
@@ -103,24 +161,12 @@ class AppGenerateResponseConverter(ABC):
         :param e: exception
         :return:
         """
-        error_responses = {
-            ValueError: {'code': 'invalid_param', 'status': 400},
-            ProviderTokenNotInitError: {'code': 'provider_not_initialize', 'status': 400},
-            QuotaExceededError: {
-                'code': 'provider_quota_exceeded',
-                'message': "Your quota for Dify Hosted Model Provider has been exhausted. "
-                           "Please go to Settings -> Model Provider to complete your own provider credentials.",
-                'status': 400
-            },
-            ModelCurrentlyNotSupportError: {'code': 'model_currently_not_support', 'status': 400},
-            InvokeError: {'code': 'completion_request_error', 'status': 400}
-        }
-
         # Determine the response based on the type of exception
         data = None
-        for k, v in error_responses.items():
-            if isinstance(e, k):
-                data = v
+        for error_type, error_response in cls._ERROR_RESPONSES:
+            if isinstance(e, error_type):
+                data = dict(error_response)
+                break
 
         if data:
             data.setdefault('message', getattr(e, 'description', str(e)))
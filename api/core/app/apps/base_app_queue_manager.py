@@ -46,20 +46,38 @@ class AppQueueManager:
         Listen to queue
         :return:
         """
+        for messages in self.listen_batch(max_size=1):
+            yield from messages
+
+    def listen_batch(self, max_size: int = 32) -> Generator[list, None, None]:
+        """
+        Listen to queue, yield the messages ready in the queue in batches
+        without waiting for the batch to be filled
+        :param max_size: max number of messages in a batch
+        :return:
+        """
         # wait for 10 minutes to stop listen
         listen_timeout = 600
         start_time = time.time()
         last_ping_time = 0
 
         while True:
+            messages = []
+            stopped = False
             try:
                 message = self._q.get(timeout=1)
-                if message is None:
-                    break
+                while True:
+                    if message is None:
+                        stopped = True
+                        break
 
-                yield message
+                    messages.append(message)
+                    if len(messages) >= max_size:
+                        break
+
+                    message = self._q.get_nowait()
             except queue.Empty:
-                continue
+                pass
             finally:
                 elapsed_time = time.time() - start_time
                 if elapsed_time >= listen_timeout or self._is_stopped():
@@ -74,6 +92,12 @@ class AppQueueManager:
                     self.publish(QueuePingEvent(), PublishFrom.TASK_PIPELINE)
                     last_ping_time = elapsed_time // 10
 
+            if messages:
+                yield messages
+
+            if stopped:
+                break
+
     def stop_listen(self) -> None:
         """
         Stop listen to queue
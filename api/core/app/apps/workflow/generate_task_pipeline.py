@@ -42,7 +42,6 @@ from models.workflow import (
     Workflow,
     WorkflowAppLog,
     WorkflowAppLogCreatedFrom,
-    WorkflowNodeExecution,
     WorkflowRun,
 )
 
@@ -87,6 +86,11 @@ class WorkflowAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCycleMa
 
         self._task_state = WorkflowTaskState()
         self._stream_generate_nodes = self._get_stream_generate_nodes()
+        self._workflow_run = None
+        self._workflow_run_created_at = None
+        self._workflow_node_executions = {}
+        self._workflow_node_execution_outputs = {}
+        self._workflow_node_execution_static_data = {}
 
     def process(self) -> Union[WorkflowAppBlockingResponse, Generator[WorkflowAppStreamResponse, None, None]]:
         """
@@ -113,8 +117,7 @@ class WorkflowAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCycleMa
             if isinstance(stream_response, ErrorStreamResponse):
                 raise stream_response.err
             elif isinstance(stream_response, WorkflowFinishStreamResponse):
-                workflow_run = db.session.query(WorkflowRun).filter(
-                    WorkflowRun.id == self._task_state.workflow_run_id).first()
+                workflow_run = self._workflow_run
 
                 response = WorkflowAppBlockingResponse(
                     task_id=self._application_generate_entity.task_id,
@@ -128,7 +131,7 @@ class WorkflowAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCycleMa
                         elapsed_time=workflow_run.elapsed_time,
                         total_tokens=workflow_run.total_tokens,
                         total_steps=workflow_run.total_steps,
-                        created_at=int(workflow_run.created_at.timestamp()),
+                        created_at=self._workflow_run_created_at,
                         finished_at=int(workflow_run.finished_at.timestamp())
                     )
                 )
@@ -361,14 +364,8 @@ class WorkflowAppGenerateTaskPipeline(BasedGenerateTaskPipeline, WorkflowCycleMa
 
                 node_execution_info = self._task_state.ran_node_execution_infos[node_id]
 
-                # get chunk node execution
-                route_chunk_node_execution = db.session.query(WorkflowNodeExecution).filter(
-                    WorkflowNodeExecution.id == node_execution_info.workflow_node_execution_id).first()
-
-                if not route_chunk_node_execution:
-                    continue
-
-                outputs = route_chunk_node_execution.outputs_dict
+                # get chunk node execution outputs
+                outputs = self._get_workflow_node_execution_outputs(node_execution_info.workflow_node_execution_id)
 
                 if not outputs:
                     continue
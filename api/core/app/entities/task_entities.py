@@ -1,3 +1,4 @@
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
 
@@ -35,13 +36,15 @@ class NodeExecutionInfo(BaseModel):
     start_at: float
 
 
-class TaskState(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class TaskState:
     """
     TaskState entity
     """
-    metadata: dict = {}
+    metadata: dict = field(default_factory=dict)
 
 
+@dataclass(slots=True, kw_only=True)
 class EasyUITaskState(TaskState):
     """
     EasyUITaskState entity
@@ -49,6 +52,7 @@ class EasyUITaskState(TaskState):
     llm_result: LLMResult
 
 
+@dataclass(slots=True, kw_only=True)
 class WorkflowTaskState(TaskState):
     """
     WorkflowTaskState entity
@@ -60,12 +64,13 @@ class WorkflowTaskState(TaskState):
     total_tokens: int = 0
     total_steps: int = 0
 
-    ran_node_execution_infos: dict[str, NodeExecutionInfo] = {}
+    ran_node_execution_infos: dict[str, NodeExecutionInfo] = field(default_factory=dict)
     latest_node_execution_info: Optional[NodeExecutionInfo] = None
 
     current_stream_generate_state: Optional[WorkflowStreamGenerateNodes] = None
 
 
+@dataclass(slots=True, kw_only=True)
 class AdvancedChatTaskState(WorkflowTaskState):
     """
     AdvancedChatTaskState entity
@@ -1,13 +1,15 @@
 import logging
 import time
-from typing import Optional, Union
+from typing import TYPE_CHECKING, Optional, Union
 
-from core.app.apps.base_app_queue_manager import AppQueueManager
+from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
 from core.app.entities.app_invoke_entities import (
     AppGenerateEntity,
 )
 from core.app.entities.queue_entities import (
     QueueErrorEvent,
+    QueueStopEvent,
+    QueueTextChunkEvent,
 )
 from core.app.entities.task_entities import (
     ErrorStreamResponse,
@@ -16,11 +18,13 @@ from core.app.entities.task_entities import (
 )
 from core.errors.error import QuotaExceededError
 from core.model_runtime.errors.invoke import InvokeAuthorizationError, InvokeError
-from core.moderation.output_moderation import ModerationRule, OutputModeration
 from extensions.ext_database import db
 from models.account import Account
 from models.model import EndUser, Message
 
+if TYPE_CHECKING:
+    from core.moderation.output_moderation import OutputModeration
+
 logger = logging.getLogger(__name__)
 
 
@@ -68,7 +72,7 @@ class BasedGenerateTaskPipeline:
             err = Exception(e.description if getattr(e, 'description', None) is not None else str(e))
 
         if message:
-            message = db.session.query(Message).filter(Message.id == message.id).first()
+            message = db.session.get(Message, message.id)
             err_desc = self._error_to_desc(err)
             message.status = 'error'
             message.error = err_desc
@@ -111,7 +115,7 @@ class BasedGenerateTaskPipeline:
         """
         return PingStreamResponse(task_id=self._application_generate_entity.task_id)
 
-    def _init_output_moderation(self) -> Optional[OutputModeration]:
+    def _init_output_moderation(self) -> Optional['OutputModeration']:
         """
         Init output moderation.
         :return:
@@ -120,6 +124,9 @@ class BasedGenerateTaskPipeline:
         sensitive_word_avoidance = app_config.sensitive_word_avoidance
 
         if sensitive_word_avoidance:
+            # local import: rare path, only apps with sensitive word avoidance need output moderation
+            from core.moderation.output_moderation import ModerationRule, OutputModeration
+
             return OutputModeration(
                 tenant_id=app_config.tenant_id,
                 app_id=app_config.app_id,
@@ -130,6 +137,39 @@ class BasedGenerateTaskPipeline:
                 queue_manager=self._queue_manager
             )
 
+    def _handle_output_moderation_chunk(self, text: str) -> bool:
+        """
+        Handle output moderation chunk.
+        :param text: text
+        :return: True if output moderation should direct output, otherwise False
+        """
+        if self._output_moderation_handler:
+            if self._output_moderation_handler.should_direct_output():
+                # stop subscribe new token when output moderation should direct output
+                self._handle_output_moderation_direct_output(self._output_moderation_handler.get_final_output())
+
+                self._queue_manager.publish(
+                    QueueStopEvent(stopped_by=QueueStopEvent.StopBy.OUTPUT_MODERATION),
+                    PublishFrom.TASK_PIPELINE
+                )
+                return True
+            else:
+                self._output_moderation_handler.append_new_token(text)
+
+        return False
+
+    def _handle_output_moderation_direct_output(self, final_output: str) -> None:
+        """
+        Publish the output moderation final output as a text chunk.
+        :param final_output: final output
+        :return:
+        """
+        self._queue_manager.publish(
+            QueueTextChunkEvent(
+                text=final_output
+            ), PublishFrom.TASK_PIPELINE
+        )
+
     def _handle_output_moderation_when_task_finished(self, completion: str) -> Optional[str]:
         """
         Handle output moderation when task finished.
@@ -4,6 +4,9 @@ import time
 from collections.abc import Generator
 from typing import Optional, Union, cast
 
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
 from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
 from core.app.entities.app_invoke_entities import (
     AgentChatAppGenerateEntity,
@@ -87,6 +90,7 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
         self._model_config = application_generate_entity.model_config
         self._conversation = conversation
         self._message = message
+        self._message_created_at = int(message.created_at.timestamp())
 
         self._task_state = EasyUITaskState(
             llm_result=LLMResult(
@@ -98,6 +102,7 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
         )
 
         self._conversation_name_generate_thread = None
+        self._annotation_replies = {}
 
     def process(self) -> Union[
         ChatbotAppBlockingResponse,
@@ -151,7 +156,7 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
                             mode=self._conversation.mode,
                             message_id=self._message.id,
                             answer=self._task_state.llm_result.message.content,
-                            created_at=int(self._message.created_at.timestamp()),
+                            created_at=self._message_created_at,
                             **extras
                         )
                     )
@@ -164,7 +169,7 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
                             conversation_id=self._conversation.id,
                             message_id=self._message.id,
                             answer=self._task_state.llm_result.message.content,
-                            created_at=int(self._message.created_at.timestamp()),
+                            created_at=self._message_created_at,
                             **extras
                         )
                     )
@@ -185,14 +190,14 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
             if isinstance(self._application_generate_entity, CompletionAppGenerateEntity):
                 yield CompletionAppStreamResponse(
                     message_id=self._message.id,
-                    created_at=int(self._message.created_at.timestamp()),
+                    created_at=self._message_created_at,
                     stream_response=stream_response
                 )
             else:
                 yield ChatbotAppStreamResponse(
                     conversation_id=self._conversation.id,
                     message_id=self._message.id,
-                    created_at=int(self._message.created_at.timestamp()),
+                    created_at=self._message_created_at,
                     stream_response=stream_response
                 )
 
@@ -276,29 +281,37 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
         llm_result = self._task_state.llm_result
         usage = llm_result.usage
 
-        self._message = db.session.query(Message).filter(Message.id == self._message.id).first()
-        self._conversation = db.session.query(Conversation).filter(Conversation.id == self._conversation.id).first()
+        self._conversation = db.session.get(Conversation, self._conversation.id)
 
-        self._message.message = PromptMessageUtil.prompt_messages_to_prompt_for_saving(
-            self._model_config.mode,
-            self._task_state.llm_result.prompt_messages
+        values = {
+            'message': PromptMessageUtil.prompt_messages_to_prompt_for_saving(
+                self._model_config.mode,
+                self._task_state.llm_result.prompt_messages
+            ),
+            'message_tokens': usage.prompt_tokens,
+            'message_unit_price': usage.prompt_unit_price,
+            'message_price_unit': usage.prompt_price_unit,
+            'answer': PromptTemplateParser.remove_template_variables(llm_result.message.content.strip())
+            if llm_result.message.content else '',
+            'answer_tokens': usage.completion_tokens,
+            'answer_unit_price': usage.completion_unit_price,
+            'answer_price_unit': usage.completion_price_unit,
+            'provider_response_latency': time.perf_counter() - self._start_at,
+            'total_price': usage.total_price,
+            'currency': usage.currency,
+            'message_metadata': json.dumps(jsonable_encoder(self._task_state.metadata))
+            if self._task_state.metadata else None,
+        }
+
+        db.session.execute(
+            update(Message).where(Message.id == self._message.id).values(**values)
         )
-        self._message.message_tokens = usage.prompt_tokens
-        self._message.message_unit_price = usage.prompt_unit_price
-        self._message.message_price_unit = usage.prompt_price_unit
-        self._message.answer = PromptTemplateParser.remove_template_variables(llm_result.message.content.strip()) \
-            if llm_result.message.content else ''
-        self._message.answer_tokens = usage.completion_tokens
-        self._message.answer_unit_price = usage.completion_unit_price
-        self._message.answer_price_unit = usage.completion_price_unit
-        self._message.provider_response_latency = time.perf_counter() - self._start_at
-        self._message.total_price = usage.total_price
-        self._message.currency = usage.currency
-        self._message.message_metadata = json.dumps(jsonable_encoder(self._task_state.metadata)) \
-            if self._task_state.metadata else None
-
         db.session.commit()
 
+        # keep the message in sync for the receivers without marking it dirty
+        for key, value in values.items():
+            set_committed_value(self._message, key, value)
+
         message_was_created.send(
             self._message,
             application_generate_entity=self._application_generate_entity,
@@ -383,11 +396,7 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
         :param event: agent thought event
         :return:
         """
-        agent_thought: MessageAgentThought = (
-            db.session.query(MessageAgentThought)
-            .filter(MessageAgentThought.id == event.agent_thought_id)
-            .first()
-        )
+        agent_thought: MessageAgentThought = db.session.get(MessageAgentThought, event.agent_thought_id)
         db.session.refresh(agent_thought)
         db.session.close()
 
@@ -406,35 +415,22 @@ class EasyUIBasedGenerateTaskPipeline(BasedGenerateTaskPipeline, MessageCycleMan
 
         return None
 
-    def _handle_output_moderation_chunk(self, text: str) -> bool:
+    def _handle_output_moderation_direct_output(self, final_output: str) -> None:
         """
-        Handle output moderation chunk.
-        :param text: text
-        :return: True if output moderation should direct output, otherwise False
+        Replace the message content with the output moderation final output and publish it.
+        :param final_output: final output
+        :return:
         """
-        if self._output_moderation_handler:
-            if self._output_moderation_handler.should_direct_output():
-                # stop subscribe new token when output moderation should direct output
-                self._task_state.llm_result.message.content = self._output_moderation_handler.get_final_output()
-                self._queue_manager.publish(
-                    QueueLLMChunkEvent(
-                        chunk=LLMResultChunk(
-                            model=self._task_state.llm_result.model,
-                            prompt_messages=self._task_state.llm_result.prompt_messages,
-                            delta=LLMResultChunkDelta(
-                                index=0,
-                                message=AssistantPromptMessage(content=self._task_state.llm_result.message.content)
-                            )
-                        )
-                    ), PublishFrom.TASK_PIPELINE
-                )
-
-                self._queue_manager.publish(
-                    QueueStopEvent(stopped_by=QueueStopEvent.StopBy.OUTPUT_MODERATION),
-                    PublishFrom.TASK_PIPELINE
+        self._task_state.llm_result.message.content = final_output
+        self._queue_manager.publish(
+            QueueLLMChunkEvent(
+                chunk=LLMResultChunk(
+                    model=self._task_state.llm_result.model,
+                    prompt_messages=self._task_state.llm_result.prompt_messages,
+                    delta=LLMResultChunkDelta(
+                        index=0,
+                        message=AssistantPromptMessage(content=self._task_state.llm_result.message.content)
+                    )
                 )
-                return True
-            else:
-                self._output_moderation_handler.append_new_token(text)
-
-        return False
+            ), PublishFrom.TASK_PIPELINE
+        )
@@ -1,7 +1,9 @@
+import os
 from threading import Thread
 from typing import Optional, Union
 
 from flask import Flask, current_app
+from sqlalchemy import bindparam, select
 
 from core.app.entities.app_invoke_entities import (
     AdvancedChatAppGenerateEntity,
@@ -23,10 +25,12 @@ from core.app.entities.task_entities import (
     MessageStreamResponse,
 )
 from core.llm_generator.llm_generator import LLMGenerator
-from core.tools.tool_file_manager import ToolFileManager
 from extensions.ext_database import db
 from models.model import AppMode, Conversation, MessageAnnotation, MessageFile
-from services.annotation_service import AppAnnotationService
+
+_MESSAGE_FILE_QUERY = select(
+    MessageFile.id, MessageFile.url, MessageFile.type, MessageFile.belongs_to
+).where(MessageFile.id == bindparam('message_file_id'))
 
 
 class MessageCycleManage:
@@ -37,6 +41,7 @@ class MessageCycleManage:
         AdvancedChatAppGenerateEntity
     ]
     _task_state: Union[EasyUITaskState, AdvancedChatTaskState]
+    _annotation_replies: dict[str, Optional[tuple[MessageAnnotation, dict]]]
 
     def _generate_conversation_name(self, conversation: Conversation, query: str) -> Optional[Thread]:
         """
@@ -69,11 +74,7 @@ class MessageCycleManage:
                                            query: str):
         with flask_app.app_context():
             # get conversation and message
-            conversation = (
-                db.session.query(Conversation)
-                .filter(Conversation.id == conversation_id)
-                .first()
-            )
+            conversation = db.session.get(Conversation, conversation_id)
 
             if conversation.mode != AppMode.COMPLETION.value:
                 app_model = conversation.app
@@ -97,20 +98,46 @@ class MessageCycleManage:
         :param event: event
         :return:
         """
-        annotation = AppAnnotationService.get_annotation_by_id(event.message_annotation_id)
-        if annotation:
-            account = annotation.account
-            self._task_state.metadata['annotation_reply'] = {
+        annotation_reply = self._get_annotation_reply(event.message_annotation_id)
+        if annotation_reply:
+            annotation, annotation_reply_metadata = annotation_reply
+            self._task_state.metadata['annotation_reply'] = annotation_reply_metadata
+
+            return annotation
+
+        return None
+
+    def _get_annotation_reply(self, annotation_id: str) -> Optional[tuple[MessageAnnotation, dict]]:
+        """
+        Get annotation and its reply metadata, cached within the task pipeline.
+        :param annotation_id: annotation id
+        :return:
+        """
+        if annotation_id in self._annotation_replies:
+            return self._annotation_replies[annotation_id]
+
+        # local import: rare path, only annotation replies need the annotation service
+        from services.annotation_service import AppAnnotationService
+
+        annotation_reply = None
+        result = AppAnnotationService.get_annotation_with_account_name_by_id(annotation_id)
+        if result:
+            annotation, account_name = result
+
+            # detach it so that later commits of the task pipeline do not expire the cached annotation
+            db.session.expunge(annotation)
+
+            annotation_reply = (annotation, {
                 'id': annotation.id,
                 'account': {
                     'id': annotation.account_id,
-                    'name': account.name if account else 'Dify user'
+                    'name': account_name if account_name else 'Dify user'
                 }
-            }
+            })
 
-            return annotation
+        self._annotation_replies[annotation_id] = annotation_reply
 
-        return None
+        return annotation_reply
 
     def _handle_retriever_resources(self, event: QueueRetrieverResourcesEvent) -> None:
         """
@@ -148,11 +175,10 @@ class MessageCycleManage:
         :param event: event
         :return:
         """
-        message_file: MessageFile = (
-            db.session.query(MessageFile)
-            .filter(MessageFile.id == event.message_file_id)
-            .first()
-        )
+        message_file = db.session.execute(
+            _MESSAGE_FILE_QUERY,
+            {'message_file_id': event.message_file_id}
+        ).first()
 
         if message_file:
             # get tool file id
@@ -161,13 +187,13 @@ class MessageCycleManage:
             tool_file_id = tool_file_id.split('.')[0]
 
             # get extension
-            if '.' in message_file.url:
-                extension = f'.{message_file.url.split(".")[-1]}'
-                if len(extension) > 10:
-                    extension = '.bin'
-            else:
+            extension = os.path.splitext(message_file.url)[1]
+            if not extension or len(extension) > 10:
                 extension = '.bin'
             # add sign url
+            # local import: rare path, only tool files need the tool file manager
+            from core.tools.tool_file_manager import ToolFileManager
+
             url = ToolFileManager.sign_file(tool_file_id=tool_file_id, extension=extension)
 
             return MessageFileStreamResponse(
@@ -49,6 +49,13 @@ class WorkflowCycleManage:
     _task_state: Union[AdvancedChatTaskState, WorkflowTaskState]
     _workflow_system_variables: dict[SystemVariable, Any]
 
+    # materialized rows kept by the task pipeline to avoid re-selecting them on every event
+    _workflow_run: Optional[WorkflowRun]
+    _workflow_run_created_at: Optional[int]
+    _workflow_node_executions: dict[str, WorkflowNodeExecution]
+    _workflow_node_execution_outputs: dict[str, Optional[dict]]
+    _workflow_node_execution_static_data: dict[str, dict]
+
     def _init_workflow_run(self, workflow: Workflow,
                            triggered_from: WorkflowRunTriggeredFrom,
                            user: Union[Account, EndUser],
@@ -278,7 +285,7 @@ class WorkflowCycleManage:
                 workflow_id=workflow_run.workflow_id,
                 sequence_number=workflow_run.sequence_number,
                 inputs=workflow_run.inputs_dict,
-                created_at=int(workflow_run.created_at.timestamp())
+                created_at=self._workflow_run_created_at
             )
         )
 
@@ -321,7 +328,7 @@ class WorkflowCycleManage:
                 total_tokens=workflow_run.total_tokens,
                 total_steps=workflow_run.total_steps,
                 created_by=created_by,
-                created_at=int(workflow_run.created_at.timestamp()),
+                created_at=self._workflow_run_created_at,
                 finished_at=int(workflow_run.finished_at.timestamp()),
                 files=self._fetch_files_from_node_outputs(workflow_run.outputs_dict)
             )
@@ -342,14 +349,8 @@ class WorkflowCycleManage:
             task_id=task_id,
             workflow_run_id=workflow_node_execution.workflow_run_id,
             data=NodeStartStreamResponse.Data(
-                id=workflow_node_execution.id,
-                node_id=workflow_node_execution.node_id,
-                node_type=workflow_node_execution.node_type,
-                title=workflow_node_execution.title,
-                index=workflow_node_execution.index,
-                predecessor_node_id=workflow_node_execution.predecessor_node_id,
-                inputs=workflow_node_execution.inputs_dict,
-                created_at=int(workflow_node_execution.created_at.timestamp())
+                **self._get_workflow_node_execution_static_data(workflow_node_execution),
+                inputs=workflow_node_execution.inputs_dict
             )
         )
 
@@ -372,29 +373,47 @@ class WorkflowCycleManage:
         :param workflow_node_execution: workflow node execution
         :return:
         """
+        outputs = self._get_workflow_node_execution_outputs(workflow_node_execution.id)
+
         return NodeFinishStreamResponse(
             task_id=task_id,
             workflow_run_id=workflow_node_execution.workflow_run_id,
             data=NodeFinishStreamResponse.Data(
-                id=workflow_node_execution.id,
-                node_id=workflow_node_execution.node_id,
-                node_type=workflow_node_execution.node_type,
-                index=workflow_node_execution.index,
-                title=workflow_node_execution.title,
-                predecessor_node_id=workflow_node_execution.predecessor_node_id,
+                **self._get_workflow_node_execution_static_data(workflow_node_execution),
                 inputs=workflow_node_execution.inputs_dict,
                 process_data=workflow_node_execution.process_data_dict,
-                outputs=workflow_node_execution.outputs_dict,
+                outputs=outputs,
                 status=workflow_node_execution.status,
                 error=workflow_node_execution.error,
                 elapsed_time=workflow_node_execution.elapsed_time,
                 execution_metadata=workflow_node_execution.execution_metadata_dict,
-                created_at=int(workflow_node_execution.created_at.timestamp()),
                 finished_at=int(workflow_node_execution.finished_at.timestamp()),
-                files=self._fetch_files_from_node_outputs(workflow_node_execution.outputs_dict)
+                files=self._fetch_files_from_node_outputs(outputs)
             )
         )
 
+    def _get_workflow_node_execution_static_data(self, workflow_node_execution: WorkflowNodeExecution) -> dict:
+        """
+        Get stream response data of workflow node execution that never changes after it is created,
+        built once per node execution
+        :param workflow_node_execution: workflow node execution
+        :return:
+        """
+        static_data = self._workflow_node_execution_static_data.get(workflow_node_execution.id)
+        if static_data is None:
+            static_data = {
+                'id': workflow_node_execution.id,
+                'node_id': workflow_node_execution.node_id,
+                'node_type': workflow_node_execution.node_type,
+                'title': workflow_node_execution.title,
+                'index': workflow_node_execution.index,
+                'predecessor_node_id': workflow_node_execution.predecessor_node_id,
+                'created_at': int(workflow_node_execution.created_at.timestamp())
+            }
+            self._workflow_node_execution_static_data[workflow_node_execution.id] = static_data
+
+        return static_data
+
     def _handle_workflow_start(self) -> WorkflowRun:
         self._task_state.start_at = time.perf_counter()
 
@@ -409,21 +428,23 @@ class WorkflowCycleManage:
         )
 
         self._task_state.workflow_run_id = workflow_run.id
+        self._workflow_run = workflow_run
+        self._workflow_run_created_at = int(workflow_run.created_at.timestamp())
 
         db.session.close()
 
         return workflow_run
 
     def _handle_node_start(self, event: QueueNodeStartedEvent) -> WorkflowNodeExecution:
-        workflow_run = db.session.query(WorkflowRun).filter(WorkflowRun.id == self._task_state.workflow_run_id).first()
         workflow_node_execution = self._init_node_execution_from_workflow_run(
-            workflow_run=workflow_run,
+            workflow_run=self._workflow_run,
             node_id=event.node_id,
             node_type=event.node_type,
             node_title=event.node_data.title,
             node_run_index=event.node_run_index,
             predecessor_node_id=event.predecessor_node_id
         )
+        self._workflow_node_executions[workflow_node_execution.id] = workflow_node_execution
 
         latest_node_execution_info = NodeExecutionInfo(
             workflow_node_execution_id=workflow_node_execution.id,
@@ -442,8 +463,9 @@ class WorkflowCycleManage:
 
     def _handle_node_finished(self, event: QueueNodeSucceededEvent | QueueNodeFailedEvent) -> WorkflowNodeExecution:
         current_node_execution = self._task_state.ran_node_execution_infos[event.node_id]
-        workflow_node_execution = db.session.query(WorkflowNodeExecution).filter(
-            WorkflowNodeExecution.id == current_node_execution.workflow_node_execution_id).first()
+        workflow_node_execution = self._attach_workflow_node_execution(
+            current_node_execution.workflow_node_execution_id
+        )
         if isinstance(event, QueueNodeSucceededEvent):
             workflow_node_execution = self._workflow_node_execution_success(
                 workflow_node_execution=workflow_node_execution,
@@ -472,17 +494,20 @@ class WorkflowCycleManage:
                 outputs=event.outputs
             )
 
+        self._workflow_node_executions[workflow_node_execution.id] = workflow_node_execution
+        self._workflow_node_execution_outputs.pop(workflow_node_execution.id, None)
+
         db.session.close()
 
         return workflow_node_execution
 
     def _handle_workflow_finished(self, event: QueueStopEvent | QueueWorkflowSucceededEvent | QueueWorkflowFailedEvent) \
             -> Optional[WorkflowRun]:
-        workflow_run = db.session.query(WorkflowRun).filter(
-            WorkflowRun.id == self._task_state.workflow_run_id).first()
-        if not workflow_run:
+        if not self._workflow_run:
             return None
 
+        workflow_run = db.session.merge(self._workflow_run, load=False)
+
         if isinstance(event, QueueStopEvent):
             workflow_run = self._workflow_run_failed(
                 workflow_run=workflow_run,
@@ -495,12 +520,12 @@ class WorkflowCycleManage:
 
             latest_node_execution_info = self._task_state.latest_node_execution_info
             if latest_node_execution_info:
-                workflow_node_execution = db.session.query(WorkflowNodeExecution).filter(
-                    WorkflowNodeExecution.id == latest_node_execution_info.workflow_node_execution_id).first()
+                workflow_node_execution = self._workflow_node_executions.get(
+                    latest_node_execution_info.workflow_node_execution_id)
                 if (workflow_node_execution
                         and workflow_node_execution.status == WorkflowNodeExecutionStatus.RUNNING.value):
                     self._workflow_node_execution_failed(
-                        workflow_node_execution=workflow_node_execution,
+                        workflow_node_execution=self._attach_workflow_node_execution(workflow_node_execution.id),
                         start_at=latest_node_execution_info.start_at,
                         error='Workflow stopped.'
                     )
@@ -515,8 +540,8 @@ class WorkflowCycleManage:
             )
         else:
             if self._task_state.latest_node_execution_info:
-                workflow_node_execution = db.session.query(WorkflowNodeExecution).filter(
-                    WorkflowNodeExecution.id == self._task_state.latest_node_execution_info.workflow_node_execution_id).first()
+                workflow_node_execution = self._workflow_node_executions[
+                    self._task_state.latest_node_execution_info.workflow_node_execution_id]
                 outputs = workflow_node_execution.outputs
             else:
                 outputs = None
@@ -530,11 +555,35 @@ class WorkflowCycleManage:
             )
 
         self._task_state.workflow_run_id = workflow_run.id
+        self._workflow_run = workflow_run
 
         db.session.close()
 
         return workflow_run
 
+    def _attach_workflow_node_execution(self, workflow_node_execution_id: str) -> WorkflowNodeExecution:
+        """
+        Attach the materialized workflow node execution to the session for update,
+        without selecting it again
+        :param workflow_node_execution_id: workflow node execution id
+        :return:
+        """
+        return db.session.merge(self._workflow_node_executions[workflow_node_execution_id], load=False)
+
+    def _get_workflow_node_execution_outputs(self, workflow_node_execution_id: str) -> Optional[dict]:
+        """
+        Get parsed outputs of workflow node execution, cached until the node finishes
+        :param workflow_node_execution_id: workflow node execution id
+        :return:
+        """
+        if workflow_node_execution_id not in self._workflow_node_execution_outputs:
+            # every node execution is kept since its node started
+            outputs = self._workflow_node_executions[workflow_node_execution_id].outputs
+            self._workflow_node_execution_outputs[workflow_node_execution_id] = \
+                json.loads(outputs) if outputs else None
+
+        return self._workflow_node_execution_outputs[workflow_node_execution_id]
+
     def _fetch_files_from_node_outputs(self, outputs_dict: dict) -> list[dict]:
         """
         Fetch files from node outputs
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from core.app.app_config.features.file_upload.manager import FileUploadConfigManager
 from core.file.message_file_parser import MessageFileParser
 from core.model_manager import ModelInstance
@@ -20,11 +22,11 @@ class TokenBufferMemory:
         self.conversation = conversation
         self.model_instance = model_instance
 
-    def get_history_prompt_messages(self, max_token_limit: int = 2000,
+    def get_history_prompt_messages(self, max_token_limit: Optional[int] = 2000,
                                     message_limit: int = 10) -> list[PromptMessage]:
         """
         Get history prompt messages.
-        :param max_token_limit: max token limit
+        :param max_token_limit: max token limit, None to get the messages without pruning
         :param message_limit: message limit
         """
         app_record = self.conversation.app
@@ -74,6 +76,18 @@ class TokenBufferMemory:
 
             prompt_messages.append(AssistantPromptMessage(content=message.answer))
 
+        if not prompt_messages or max_token_limit is None:
+            return prompt_messages
+
+        return self.prune_history_prompt_messages(prompt_messages, max_token_limit)
+
+    def prune_history_prompt_messages(self, prompt_messages: list[PromptMessage],
+                                      max_token_limit: int) -> list[PromptMessage]:
+        """
+        Prune the oldest history prompt messages until they fit into the max token limit.
+        :param prompt_messages: history prompt messages
+        :param max_token_limit: max token limit
+        """
         if not prompt_messages:
             return []
 
@@ -88,15 +102,24 @@ class TokenBufferMemory:
         )
 
         if curr_message_tokens > max_token_limit:
-            pruned_memory = []
-            while curr_message_tokens > max_token_limit and prompt_messages:
-                pruned_memory.append(prompt_messages.pop(0))
+            # prune the oldest messages, binary search the fewest messages to prune
+            # instead of counting the tokens of the rest messages after pruning each one
+            low, high = 1, len(prompt_messages)
+            while low < high:
+                mid = (low + high) // 2
                 curr_message_tokens = model_type_instance.get_num_tokens(
                     self.model_instance.model,
                     self.model_instance.credentials,
-                    prompt_messages
+                    prompt_messages[mid:]
                 )
 
+                if curr_message_tokens > max_token_limit:
+                    low = mid + 1
+                else:
+                    high = mid
+
+            prompt_messages = prompt_messages[low:]
+
         return prompt_messages
 
     def get_history_prompt_text(self, human_prefix: str = "Human",
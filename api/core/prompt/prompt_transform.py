@@ -13,8 +13,14 @@ class PromptTransform:
                                memory_config: MemoryConfig,
                                prompt_messages: list[PromptMessage],
                                model_config: ModelConfigWithCredentialsEntity) -> list[PromptMessage]:
+        histories = self._get_history_messages_list_from_memory(memory, memory_config, None)
+
+        # skip counting prompt tokens when there are no histories to fit into the rest tokens
+        if not histories:
+            return prompt_messages
+
         rest_tokens = self._calculate_rest_token(prompt_messages, model_config)
-        histories = self._get_history_messages_list_from_memory(memory, memory_config, rest_tokens)
+        histories = memory.prune_history_prompt_messages(histories, rest_tokens)
         prompt_messages.extend(histories)
 
         return prompt_messages
@@ -23,7 +29,8 @@ class PromptTransform:
                               model_config: ModelConfigWithCredentialsEntity) -> int:
         rest_tokens = 2000
 
-        model_context_tokens = model_config.model_schema.model_properties.get(ModelPropertyKey.CONTEXT_SIZE)
+        model_schema = model_config.model_schema
+        model_context_tokens = model_schema.model_properties.get(ModelPropertyKey.CONTEXT_SIZE)
         if model_context_tokens:
             model_type_instance = model_config.provider_model_bundle.model_type_instance
             model_type_instance = cast(LargeLanguageModel, model_type_instance)
@@ -35,11 +42,15 @@ class PromptTransform:
             )
 
             max_tokens = 0
-            for parameter_rule in model_config.model_schema.parameter_rules:
+            parameters = model_config.parameters
+            for parameter_rule in model_schema.parameter_rules:
                 if (parameter_rule.name == 'max_tokens'
                         or (parameter_rule.use_template and parameter_rule.use_template == 'max_tokens')):
-                    max_tokens = (model_config.parameters.get(parameter_rule.name)
-                                  or model_config.parameters.get(parameter_rule.use_template)) or 0
+                    # a max_tokens of 0 is kept, only a missing value falls back to the template parameter
+                    max_tokens = parameters.get(parameter_rule.name)
+                    if max_tokens is None:
+                        max_tokens = parameters.get(parameter_rule.use_template)
+                    max_tokens = max_tokens or 0
 
             rest_tokens = model_context_tokens - max_tokens - curr_message_tokens
             rest_tokens = max(rest_tokens, 0)
@@ -71,7 +82,7 @@ class PromptTransform:
 
     def _get_history_messages_list_from_memory(self, memory: TokenBufferMemory,
                                                memory_config: MemoryConfig,
-                                               max_token_limit: int) -> list[PromptMessage]:
+                                               max_token_limit: Optional[int]) -> list[PromptMessage]:
         """Get memory messages."""
         return memory.get_history_prompt_messages(
             max_token_limit=max_token_limit,
@@ -0,0 +1,8 @@
+from core.app.app_config.easy_ui_based_app.dataset.manager import DatasetConfigManager
+from events.dataset_event import dataset_was_deleted
+
+
+@dataset_was_deleted.connect
+def handle(sender, **kwargs):
+    dataset = sender
+    DatasetConfigManager.delete_dataset_cache(dataset.id)
@@ -41,8 +41,6 @@ def handle(sender, **kwargs):
             )
             db.session.add(app_dataset_join)
 
-    db.session.commit()
-
 
 def get_dataset_ids_from_model_config(app_model_config: AppModelConfig) -> set:
     dataset_ids = set()
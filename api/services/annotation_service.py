@@ -1,5 +1,6 @@
 import datetime
 import uuid
+from typing import Optional
 
 import pandas as pd
 from flask_login import current_user
@@ -9,6 +10,7 @@ from werkzeug.exceptions import NotFound
 
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
+from models.account import Account
 from models.model import App, AppAnnotationHitHistory, AppAnnotationSetting, Message, MessageAnnotation
 from services.feature_service import FeatureService
 from tasks.annotation.add_annotation_to_index_task import add_annotation_to_index_task
@@ -340,6 +342,19 @@ class AppAnnotationService:
             return None
         return annotation
 
+    @classmethod
+    def get_annotation_with_account_name_by_id(cls, annotation_id: str) \
+            -> tuple[MessageAnnotation, Optional[str]] | None:
+        result = (db.session.query(MessageAnnotation, Account.name)
+                  .outerjoin(Account, Account.id == MessageAnnotation.account_id)
+                  .filter(MessageAnnotation.id == annotation_id)
+                  .first())
+
+        if not result:
+            return None
+        annotation, account_name = result
+        return annotation, account_name
+
     @classmethod
     def add_annotation_history(cls, annotation_id: str, app_id: str, annotation_question: str,
                                annotation_content: str, query: str, user_id: str,
@@ -219,6 +219,8 @@ class AppService:
                 app_model_config=app_model_config
             )
 
+            db.session.commit()
+
         return app
 
     def export_app(self, app: App) -> str:
@@ -136,6 +136,15 @@ class DatasetService:
             id=dataset_id
         ).first()
 
+    @staticmethod
+    def get_exist_dataset_ids(tenant_id: str, dataset_ids: list[str]) -> set[str]:
+        datasets = db.session.query(Dataset.id).filter(
+            Dataset.tenant_id == tenant_id,
+            Dataset.id.in_(dataset_ids)
+        ).all()
+
+        return {dataset.id for dataset in datasets}
+
     @staticmethod
     def check_dataset_model_setting(dataset):
         if dataset.indexing_technique == 'high_quality':
@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+
+from core.app.app_config.easy_ui_based_app.dataset import manager
+from core.app.app_config.easy_ui_based_app.dataset.manager import DatasetConfigManager
+from models.model import AppMode
+from services.dataset_service import DatasetService
+
+DATASET_IDS = [
+    '5f3b3f6e-2d3c-4c39-9a0e-1c3f0b5f8d11',
+    '0c8a4b41-7e5d-4f0b-8f5c-2b6f1c1d9e22',
+]
+
+
+def _make_config(dataset_ids: list[str]) -> dict:
+    return {
+        'agent_mode': {
+            'enabled': True,
+            'tools': [{'dataset': {'enabled': True, 'id': dataset_id}} for dataset_id in dataset_ids]
+        }
+    }
+
+
+@pytest.fixture(autouse=True)
+def clear_dataset_cache():
+    manager._dataset_tenant_ids.clear()
+    yield
+    manager._dataset_tenant_ids.clear()
+
+
+def test_extract_dataset_config_checks_datasets_with_single_query():
+    with patch.object(DatasetService, 'get_exist_dataset_ids', return_value=set(DATASET_IDS)) as mock:
+        DatasetConfigManager.extract_dataset_config_for_legacy_compatibility(
+            'tenant_id', AppMode.CHAT, _make_config(DATASET_IDS + DATASET_IDS)
+        )
+        # cached datasets are not queried again
+        DatasetConfigManager.extract_dataset_config_for_legacy_compatibility(
+            'tenant_id', AppMode.CHAT, _make_config(DATASET_IDS)
+        )
+
+    assert mock.call_count == 1
+    assert sorted(mock.call_args.args[1]) == sorted(DATASET_IDS)
+
+
+def test_extract_dataset_config_with_not_exist_dataset():
+    with patch.object(DatasetService, 'get_exist_dataset_ids', return_value={DATASET_IDS[0]}):
+        with pytest.raises(ValueError, match='Dataset ID does not exist'):
+            DatasetConfigManager.extract_dataset_config_for_legacy_compatibility(
+                'tenant_id', AppMode.CHAT, _make_config(DATASET_IDS)
+            )
+
+
+def test_extract_dataset_config_with_invalid_dataset_id():
+    with pytest.raises(ValueError, match='id in dataset must be of UUID type'):
+        DatasetConfigManager.extract_dataset_config_for_legacy_compatibility(
+            'tenant_id', AppMode.CHAT, _make_config(['not-a-uuid'])
+        )
+
+
+def test_validate_completion_app_without_dataset_query_variable():
+    with patch.object(DatasetService, 'get_exist_dataset_ids', return_value=set(DATASET_IDS)):
+        with pytest.raises(ValueError, match='Dataset query variable is required'):
+            DatasetConfigManager.validate_and_set_defaults(
+                'tenant_id', AppMode.COMPLETION, _make_config(DATASET_IDS)
+            )
+
+        config = _make_config(DATASET_IDS)
+        config['dataset_query_variable'] = 'query'
+        config, _ = DatasetConfigManager.validate_and_set_defaults('tenant_id', AppMode.COMPLETION, config)
+
+    assert config['dataset_configs']['retrieval_model'] == 'single'
+
+
+def test_extract_dataset_config_caches_upper_case_dataset_ids():
+    with patch.object(DatasetService, 'get_exist_dataset_ids', return_value=set(DATASET_IDS)) as mock:
+        for _ in range(2):
+            DatasetConfigManager.extract_dataset_config_for_legacy_compatibility(
+                'tenant_id', AppMode.CHAT, _make_config([dataset_id.upper() for dataset_id in DATASET_IDS])
+            )
+
+    assert mock.call_count == 1
+
+
+def test_extract_dataset_config_skips_empty_tools():
+    config = _make_config([])
+    config['agent_mode']['tools'] = [{}]
+
+    config, has_agent_datasets = DatasetConfigManager.extract_dataset_config_for_legacy_compatibility(
+        'tenant_id', AppMode.CHAT, config
+    )
+
+    assert not has_agent_datasets
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.app.apps.advanced_chat import generate_task_pipeline
+from core.app.apps.advanced_chat.generate_task_pipeline import AdvancedChatAppGenerateTaskPipeline
+from core.app.entities.queue_entities import QueuePingEvent, QueueTextChunkEvent
+from core.app.entities.task_entities import (
+    AdvancedChatTaskState,
+    MessageEndStreamResponse,
+    MessageStreamResponse,
+    PingStreamResponse,
+)
+from core.model_runtime.entities.llm_entities import LLMUsage
+
+
+@pytest.fixture
+def time_mock():
+    with patch.object(generate_task_pipeline, 'time') as time_mock:
+        # the clock only moves when a test moves it
+        time_mock.monotonic.return_value = 0.0
+        time_mock.perf_counter.return_value = 0.0
+        yield time_mock
+
+
+@pytest.fixture
+def pipeline(time_mock):
+    pipeline = AdvancedChatAppGenerateTaskPipeline.__new__(AdvancedChatAppGenerateTaskPipeline)
+    pipeline._application_generate_entity = MagicMock(task_id='task_id')
+    pipeline._message = MagicMock(id='message_id')
+    pipeline._queue_manager = MagicMock()
+    pipeline._output_moderation_handler = None
+    pipeline._conversation_name_generate_thread = None
+    pipeline._answer_parts = []
+    pipeline._pending_buf = []
+    pipeline._pending_chars = 0
+    pipeline._last_flush_at = 0.0
+    pipeline._is_stream_out_support = MagicMock(return_value=True)
+    pipeline._stream_handlers = pipeline._init_stream_handlers()
+
+    return pipeline
+
+
+def _text_chunks(*texts: str) -> list[MagicMock]:
+    return [MagicMock(event=QueueTextChunkEvent(text=text)) for text in texts]
+
+
+def test_enqueue_chunk_flushes_when_chars_limit_reached(pipeline):
+    assert pipeline._enqueue_chunk('a' * (pipeline._CHUNK_FLUSH_CHARS - 1)) is None
+
+    response = pipeline._enqueue_chunk('b')
+
+    assert isinstance(response, MessageStreamResponse)
+    assert response.answer == 'a' * (pipeline._CHUNK_FLUSH_CHARS - 1) + 'b'
+    assert pipeline._pending_buf == []
+    assert pipeline._pending_chars == 0
+
+
+def test_enqueue_chunk_flushes_when_interval_exceeded(pipeline, time_mock):
+    assert pipeline._enqueue_chunk('a') is None
+
+    time_mock.monotonic.return_value = pipeline._CHUNK_FLUSH_INTERVAL
+    response = pipeline._enqueue_chunk('b')
+
+    assert response.answer == 'ab'
+
+
+def test_process_stream_response_merges_chunk_batches_into_one_frame(pipeline):
+    pipeline._queue_manager.listen_batch.return_value = iter([
+        _text_chunks('a'),
+        _text_chunks('b', 'c'),
+        _text_chunks('d'),
+        [MagicMock(event=QueuePingEvent())],
+        _text_chunks('e'),
+    ])
+
+    responses = list(pipeline._process_stream_response())
+
+    # chunks of several batches are flushed in one frame before the ping, the rest when listening stopped
+    assert [type(response) for response in responses] == [
+        MessageStreamResponse, PingStreamResponse, MessageStreamResponse
+    ]
+    assert responses[0].answer == 'abcd'
+    assert responses[2].answer == 'e'
+    assert pipeline._answer_parts == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_process_stream_response_flushes_across_batches_when_interval_exceeded(pipeline, time_mock):
+    def listen_batch():
+        yield _text_chunks('a')
+        yield _text_chunks('b')
+        time_mock.monotonic.return_value = pipeline._CHUNK_FLUSH_INTERVAL
+        yield _text_chunks('c')
+        yield _text_chunks('d')
+
+    pipeline._queue_manager.listen_batch.return_value = listen_batch()
+
+    responses = list(pipeline._process_stream_response())
+
+    assert [response.answer for response in responses] == ['abc', 'd']
+
+
+def test_save_message_and_end_commits_message_before_message_end(pipeline):
+    pipeline._task_state = AdvancedChatTaskState(usage=LLMUsage.empty_usage())
+    pipeline._answer_parts = ['Hello', ' world']
+    pipeline._start_at = 0.0
+    pipeline._conversation = MagicMock()
+
+    with patch.object(generate_task_pipeline, 'db') as db_mock, \
+            patch.object(generate_task_pipeline, 'message_was_created'):
+        responses = pipeline._save_message_and_end()
+        response = next(responses)
+
+        # the message is updated and committed by the time message end is observed
+        assert isinstance(response, MessageEndStreamResponse)
+        db_mock.session.execute.assert_called_once()
+        db_mock.session.commit.assert_called_once()
+
+    update_statement = db_mock.session.execute.call_args.args[0]
+    assert update_statement.compile().params['answer'] == 'Hello world'
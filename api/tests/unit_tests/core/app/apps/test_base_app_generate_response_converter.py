@@ -0,0 +1,34 @@
+from core.app.apps.chat.generate_response_converter import ChatAppGenerateResponseConverter
+
+
+def test__get_simple_metadata():
+    metadata = {
+        'retriever_resources': [
+            {
+                'position': 1,
+                'dataset_id': 'dataset_id',
+                'document_id': 'document_id',
+                'document_name': 'document_name',
+                'segment_id': 'segment_id',
+                'score': 0.5,
+                'content': 'content',
+                'hit_count': 1
+            }
+        ],
+        'annotation_reply': {'id': 'annotation_id'},
+        'usage': {'total_tokens': 10}
+    }
+
+    simple_metadata = ChatAppGenerateResponseConverter._get_simple_metadata(metadata)
+
+    assert simple_metadata == {
+        'retriever_resources': [
+            {
+                'segment_id': 'segment_id',
+                'position': 1,
+                'document_name': 'document_name',
+                'score': 0.5,
+                'content': 'content'
+            }
+        ]
+    }
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+import pytest
+
+from core.app.apps import base_app_queue_manager
+from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
+from core.app.entities.app_invoke_entities import InvokeFrom
+from core.app.entities.queue_entities import AppQueueEvent
+
+
+class QueueManager(AppQueueManager):
+    def _publish(self, event: AppQueueEvent, pub_from: PublishFrom) -> None:
+        self._q.put(event)
+
+
+@pytest.fixture
+def queue_manager():
+    with patch.object(base_app_queue_manager, 'redis_client') as redis_client_mock:
+        # task is not stopped
+        redis_client_mock.get.return_value = None
+        yield QueueManager(task_id='task_id', user_id='user_id', invoke_from=InvokeFrom.SERVICE_API)
+
+
+def _put(queue_manager: QueueManager, *messages) -> None:
+    for message in messages:
+        queue_manager._q.put(message)
+
+
+def test_listen_batch_with_max_size(queue_manager):
+    _put(queue_manager, 1, 2, 3, 4, 5, None)
+
+    assert list(queue_manager.listen_batch(max_size=2)) == [[1, 2], [3, 4], [5]]
+
+
+def test_listen_batch_drains_ready_messages(queue_manager):
+    _put(queue_manager, 1, 2, 3)
+
+    batches = queue_manager.listen_batch()
+    assert next(batches) == [1, 2, 3]
+
+    _put(queue_manager, 4, None)
+    assert list(batches) == [[4]]
+
+
+def test_listen_batch_stops_on_none(queue_manager):
+    _put(queue_manager, 1, None, 2)
+
+    assert list(queue_manager.listen_batch()) == [[1]]
+    assert queue_manager._q.get_nowait() == 2
+
+
+def test_listen_yields_messages_of_single_message_batches(queue_manager):
+    _put(queue_manager, 1, 2, 3, None)
+
+    with patch.object(queue_manager, 'listen_batch', wraps=queue_manager.listen_batch) as listen_batch_mock:
+        assert list(queue_manager.listen()) == [1, 2, 3]
+
+    listen_batch_mock.assert_called_once_with(max_size=1)
@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.memory import token_buffer_memory
+from core.memory.token_buffer_memory import TokenBufferMemory
+from core.model_runtime.entities.message_entities import PromptMessage
+
+
+def _get_num_tokens(model: str, credentials: dict, prompt_messages: list[PromptMessage]) -> int:
+    # per message overhead and reply priming, like the chat model tokenizers
+    return sum(len(prompt_message.content) + 4 for prompt_message in prompt_messages) + 3
+
+
+def _prune_one_by_one(prompt_messages: list[PromptMessage], max_token_limit: int) -> list[PromptMessage]:
+    # the pruning before binary search, drop the oldest message and count again
+    prompt_messages = list(prompt_messages)
+    curr_message_tokens = _get_num_tokens('', {}, prompt_messages)
+    while curr_message_tokens > max_token_limit and prompt_messages:
+        prompt_messages.pop(0)
+        curr_message_tokens = _get_num_tokens('', {}, prompt_messages)
+
+    return prompt_messages
+
+
+def _get_history_prompt_messages(max_token_limit: int) -> list[PromptMessage]:
+    messages = [
+        MagicMock(query=f'query {i}' * (i + 1), answer=f'answer {i}' * (i + 2), message_files=[])
+        for i in range(5)
+    ]
+
+    model_type_instance = MagicMock()
+    model_type_instance.get_num_tokens.side_effect = _get_num_tokens
+
+    with patch.object(token_buffer_memory, 'db') as db_mock, \
+            patch.object(token_buffer_memory, 'model_provider_factory') as model_provider_factory_mock:
+        # messages are queried latest first
+        (db_mock.session.query.return_value.filter.return_value.order_by.return_value
+         .limit.return_value.all.return_value) = list(reversed(messages))
+        (model_provider_factory_mock.get_provider_instance.return_value
+         .get_model_instance.return_value) = model_type_instance
+
+        memory = TokenBufferMemory(conversation=MagicMock(), model_instance=MagicMock())
+        return memory.get_history_prompt_messages(max_token_limit=max_token_limit)
+
+
+@pytest.mark.parametrize(('max_token_limit', 'pruned'), [
+    (10000, 'none'),
+    (150, 'part'),
+    (5, 'all'),
+])
+def test_get_history_prompt_messages_pruning(max_token_limit, pruned):
+    all_prompt_messages = _get_history_prompt_messages(max_token_limit=10000)
+    prompt_messages = _get_history_prompt_messages(max_token_limit=max_token_limit)
+
+    assert prompt_messages == _prune_one_by_one(all_prompt_messages, max_token_limit)
+    if pruned == 'none':
+        assert len(prompt_messages) == len(all_prompt_messages) == 10
+    elif pruned == 'part':
+        assert 0 < len(prompt_messages) < len(all_prompt_messages)
+    else:
+        assert prompt_messages == []
@@ -87,6 +87,7 @@ def test__get_chat_model_prompt_messages(get_chat_model_args):
         AssistantPromptMessage(content="Hello1!")
     ]
     memory.get_history_prompt_messages = MagicMock(return_value=history_prompt_messages)
+    memory.prune_history_prompt_messages = MagicMock(return_value=history_prompt_messages)
 
     prompt_transform = AdvancedPromptTransform()
     prompt_transform._calculate_rest_token = MagicMock(return_value=2000)
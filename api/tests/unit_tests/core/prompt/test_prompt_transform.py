@@ -2,9 +2,11 @@ from unittest.mock import MagicMock
 
 from core.app.app_config.entities import ModelConfigEntity
 from core.entities.provider_configuration import ProviderModelBundle
+from core.memory.token_buffer_memory import TokenBufferMemory
 from core.model_runtime.entities.message_entities import UserPromptMessage
 from core.model_runtime.entities.model_entities import AIModelEntity, ModelPropertyKey, ParameterRule
 from core.model_runtime.model_providers.__base.large_language_model import LargeLanguageModel
+from core.prompt.entities.advanced_prompt_entities import MemoryConfig
 from core.prompt.prompt_transform import PromptTransform
 
 
@@ -45,3 +47,61 @@ def test__calculate_rest_token():
                             - large_language_model_mock.get_num_tokens.return_value)
     assert rest_tokens == expected_rest_tokens
     assert rest_tokens == 6
+
+
+def test__append_chat_histories_without_history_messages():
+    memory_mock = MagicMock(spec=TokenBufferMemory)
+    memory_mock.get_history_prompt_messages.return_value = []
+
+    prompt_transform = PromptTransform()
+    prompt_transform._calculate_rest_token = MagicMock(return_value=2000)
+
+    prompt_messages = [UserPromptMessage(content="Hello, how are you?")]
+    result = prompt_transform._append_chat_histories(
+        memory=memory_mock,
+        memory_config=MemoryConfig(window=MemoryConfig.WindowConfig(enabled=False)),
+        prompt_messages=prompt_messages,
+        model_config=MagicMock(spec=ModelConfigEntity)
+    )
+
+    assert result == prompt_messages
+    # histories are fetched once without pruning, nothing is counted without histories
+    memory_mock.get_history_prompt_messages.assert_called_once_with(max_token_limit=None, message_limit=10)
+    prompt_transform._calculate_rest_token.assert_not_called()
+    memory_mock.prune_history_prompt_messages.assert_not_called()
+
+
+def test__calculate_rest_token_with_zero_max_tokens():
+    model_schema_mock = MagicMock(spec=AIModelEntity)
+    parameter_rule_mock = MagicMock(spec=ParameterRule)
+    parameter_rule_mock.name = 'max_output_tokens'
+    parameter_rule_mock.use_template = 'max_tokens'
+    model_schema_mock.parameter_rules = [
+        parameter_rule_mock
+    ]
+    model_schema_mock.model_properties = {
+        ModelPropertyKey.CONTEXT_SIZE: 62
+    }
+
+    large_language_model_mock = MagicMock(spec=LargeLanguageModel)
+    large_language_model_mock.get_num_tokens.return_value = 6
+
+    provider_model_bundle_mock = MagicMock(spec=ProviderModelBundle)
+    provider_model_bundle_mock.model_type_instance = large_language_model_mock
+
+    model_config_mock = MagicMock(spec=ModelConfigEntity)
+    model_config_mock.model = 'gpt-4'
+    model_config_mock.credentials = {}
+    model_config_mock.parameters = {
+        'max_output_tokens': 0,
+        'max_tokens': 50
+    }
+    model_config_mock.model_schema = model_schema_mock
+    model_config_mock.provider_model_bundle = provider_model_bundle_mock
+
+    prompt_transform = PromptTransform()
+
+    prompt_messages = [UserPromptMessage(content="Hello, how are you?")]
+    rest_tokens = prompt_transform._calculate_rest_token(prompt_messages, model_config_mock)
+
+    assert rest_tokens == 56
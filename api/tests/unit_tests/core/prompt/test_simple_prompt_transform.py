@@ -149,6 +149,7 @@ def test__get_chat_model_prompt_messages():
         AssistantPromptMessage(content="Hello")
     ]
     memory_mock.get_history_prompt_messages.return_value = history_prompt_messages
+    memory_mock.prune_history_prompt_messages.return_value = history_prompt_messages
 
     prompt_transform = SimplePromptTransform()
     prompt_transform._calculate_rest_token = MagicMock(return_value=2000)